@@ -1,30 +1,93 @@
-from pydantic import BaseModel
-from typing import List
-from fastapi import FastAPI
-from model import Model
-import pandas as pd
+import os
+import time
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
+from holder import holder, TIERS, DEFAULT_TIER
+from batcher import MicroBatcher
+from executor import InferenceExecutor, Overloaded, REQUEST_TIMEOUT_MS, RETRY_AFTER
+from bulk import BulkReader, media_type, spool, score_chunk, header, summary, failure
+from payload import CarModel, OFFLOAD_BODY_BYTES, OFFLOAD_ROWS, decode_json, decode_json_chunked, json_response, json_response_chunked
+from columnar import ARROW_STREAM, accepts_arrow, is_arrow, read_table, predict_table, write_prediction
+from metrics import metrics, log_payload, RequestTimer, CONTENT_TYPE
 from param import description
 
 
-class CarModel(BaseModel):
-    model_key: List[str]
-    mileage: List[int]
-    engine_power: List[int]
-    fuel: List[str]
-    paint_color: List[str]
-    car_type: List[str]
-    private_parking_available: List[bool]
-    has_gps: List[bool]
-    has_air_conditioning: List[bool]
-    automatic_car: List[bool]
-    has_getaround_connect: List[bool]
-    has_speed_regulator: List[bool]
-    winter_tires: List[bool]
+METADATA_MAX_AGE = int(os.environ.get('METADATA_MAX_AGE', 60))
+
+
+executor = InferenceExecutor()
+# One batcher per tier: a batch is scored by a single model
+batchers = {
+    tier: MicroBatcher(lambda x, tier=tier: holder.predict(x, tier), executor=executor)
+    for tier in TIERS
+}
+
+
+@asynccontextmanager
+async def lifespan(app):
+    try:
+        if holder.ready:
+            # Preloaded by the gunicorn master, only warm it up in this worker
+            for model in holder.models.values():
+                model.warm_up()
+        else:
+            holder.load()
+    except Exception as e:
+        logging.error(f'Error loading model at startup: {e}')
+    watcher = asyncio.create_task(holder.watch())
+    executor.start()
+    for batcher in batchers.values():
+        batcher.start()
+    yield
+    for batcher in batchers.values():
+        await batcher.stop()
+    executor.shutdown()
+    watcher.cancel()
 
 
 app = FastAPI(
-        description=description
+        description=description,
+        lifespan=lifespan
         )
+app.add_middleware(RequestTimer)
+
+metrics.gauge(
+    'model_info', 'Model version currently served per tier',
+    lambda: {f'{{tier="{tier}",version="{version}"}}': 1 for tier, version in holder.versions().items()}
+)
+metrics.gauge('inference_pending_requests', 'Predictions queued or running', lambda: executor.pending)
+metrics.gauge('inference_rejected_total', 'Predictions rejected with 429', lambda: executor.rejected, kind='counter')
+metrics.gauge('inference_timed_out_total', 'Predictions past their deadline', lambda: executor.timed_out, kind='counter')
+metrics.gauge(
+    'prediction_cache_entries', 'Entries in the prediction cache',
+    lambda: {f'{{tier="{tier}"}}': len(cache.entries) for tier, cache in holder.caches.items()}
+)
+metrics.gauge(
+    'prediction_cache_lookups_total', 'Prediction cache lookups',
+    lambda: {
+        f'{{tier="{tier}",result="{result}"}}': count
+        for tier, cache in holder.caches.items()
+        for result, count in (('hit', cache.hits), ('miss', cache.misses))
+    },
+    kind='counter'
+)
+
+
+def resolve_tier(tier):
+    if tier not in TIERS:
+        raise HTTPException(status_code=422, detail=f"Unknown tier {tier!r}, expected one of {', '.join(TIERS)}")
+    return holder.resolve(tier)
+
+
+def too_many_requests():
+    return HTTPException(
+        status_code=429,
+        detail='Too many pending predictions',
+        headers={'Retry-After': str(RETRY_AFTER)}
+    )
 
 
 @app.get('/')
@@ -32,25 +95,171 @@ async def index():
     return 'Hello world'
 
 
-@app.post('/predict')
-async def predict(car_model: CarModel):
-    x = {
-            'model_key': car_model.model_key,
-            'mileage': car_model.mileage,
-            'engine_power': car_model.engine_power,
-            'fuel': car_model.fuel,
-            'paint_color': car_model.paint_color,
-            'car_type': car_model.car_type,
-            'private_parking_available': car_model.private_parking_available,
-            'has_gps': car_model.has_gps,
-            'has_air_conditioning': car_model.has_air_conditioning,
-            'automatic_car': car_model.automatic_car,
-            'has_getaround_connect': car_model.has_getaround_connect,
-            'has_speed_regulator': car_model.has_speed_regulator,
-            'winter_tires': car_model.winter_tires
-            }
-    print(x)
-    y = pd.DataFrame(x)
-    model = Model()
-    print(model(y))
-    return {'prediction': model(y).tolist()}
+@app.get('/health')
+async def health():
+    return {'status': 'ok', 'model_version': holder.model_version, 'tiers': holder.versions()}
+
+
+@app.get('/ready')
+async def ready():
+    if not holder.ready:
+        raise HTTPException(status_code=503, detail='Model not loaded')
+    return {'status': 'ready', 'model_version': holder.model_version}
+
+
+@app.get('/metadata')
+async def metadata(request: Request):
+    if not holder.ready:
+        raise HTTPException(status_code=503, detail='Model not loaded')
+    model_version, body, etag = holder.metadata()
+    headers = {
+        'ETag': etag,
+        'Cache-Control': f'max-age={METADATA_MAX_AGE}',
+        'X-Model-Version': str(model_version),
+    }
+    if etag in request.headers.get('if-none-match', ''):
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type='application/json', headers=headers)
+
+
+@app.get('/metrics')
+async def prometheus_metrics():
+    return Response(metrics.render(), media_type=CONTENT_TYPE)
+
+
+@app.get('/stats/batching')
+async def batching_stats():
+    return {tier: batcher.stats() for tier, batcher in batchers.items()}
+
+
+@app.get('/stats/cache')
+async def cache_stats():
+    return {tier: cache.stats() for tier, cache in holder.caches.items()}
+
+
+@app.get('/stats/executor')
+async def executor_stats():
+    return executor.stats()
+
+
+@app.post(
+    '/predict',
+    openapi_extra={
+        'requestBody': {
+            'required': True,
+            'content': {
+                'application/json': {'schema': CarModel.model_json_schema()},
+                ARROW_STREAM: {'schema': {'type': 'string', 'format': 'binary'}},
+            },
+        }
+    }
+)
+async def predict(request: Request, tier: str = DEFAULT_TIER):
+    if not holder.ready:
+        raise HTTPException(status_code=503, detail='Model not loaded')
+    tier = resolve_tier(tier)
+    body = await request.body()
+    if is_arrow(request.headers.get('content-type')):
+        try:
+            with metrics.time('decode'):
+                table = read_table(body)
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+        # Arrow payloads are already columnar batches: they skip the
+        # micro-batcher, which would turn their arrays back into lists.
+        prediction, model_version = await run_with_deadline(
+            executor.run(predict_table, holder.models[tier], table)
+        )
+        log_payload(table, prediction, model_version)
+    else:
+        async def decode_and_predict():
+            if len(body) > OFFLOAD_BODY_BYTES:
+                x = await executor.run(decode_json_chunked, body)
+            else:
+                x = decode_json(body)
+            return x, await batchers[tier].submit(x)
+
+        x, (prediction, model_version) = await run_with_deadline(decode_and_predict())
+        log_payload(x, prediction, model_version)
+    headers = {'X-Model-Version': str(model_version), 'X-Model-Tier': tier}
+    if accepts_arrow(request.headers.get('accept')):
+        encode = arrow_response
+    else:
+        encode = json_response_chunked if len(prediction) > OFFLOAD_ROWS else json_response
+    if len(prediction) > OFFLOAD_ROWS:
+        return await executor.run(encode, prediction, model_version, headers)
+    return encode(prediction, model_version, headers)
+
+
+def arrow_response(prediction, model_version, headers):
+    with metrics.time('serialize'):
+        return Response(write_prediction(prediction, model_version), media_type=ARROW_STREAM, headers=headers)
+
+
+async def run_with_deadline(prediction):
+    try:
+        with executor.admit():
+            return await asyncio.wait_for(prediction, REQUEST_TIMEOUT_MS / 1000)
+    except Overloaded:
+        prediction.close()
+        raise too_many_requests()
+    except asyncio.TimeoutError:
+        executor.timed_out += 1
+        raise HTTPException(
+            status_code=503,
+            detail='Prediction deadline exceeded',
+            headers={'Retry-After': str(RETRY_AFTER)}
+        )
+
+
+@app.post('/predict/bulk')
+async def predict_bulk(request: Request, tier: str = DEFAULT_TIER):
+    if not holder.ready:
+        raise HTTPException(status_code=503, detail='Model not loaded')
+    tier = resolve_tier(tier)
+    media = media_type(request.headers.get('content-type'))
+    if media is None:
+        raise HTTPException(status_code=415, detail='Expected text/csv or application/x-ndjson')
+    try:
+        executor.acquire()
+    except Overloaded:
+        raise too_many_requests()
+    try:
+        start = time.perf_counter()
+        f = await spool(request.stream())
+        reader = await executor.run(BulkReader, f, media)
+    except ValueError as e:
+        executor.release()
+        raise HTTPException(status_code=422, detail=str(e))
+    except BaseException:
+        executor.release()
+        raise
+    # Every chunk of the file is scored by the same model version.
+    model = holder.models[tier]
+
+    async def results():
+        rows = 0
+        try:
+            yield header(reader)
+            while True:
+                try:
+                    scored = await executor.run(score_chunk, model, reader)
+                except Exception as e:
+                    logging.error(f'Error scoring bulk chunk after {rows} rows: {e}')
+                    yield failure(reader, e, rows)
+                    return
+                if scored is None:
+                    break
+                n_rows, lines = scored
+                rows += n_rows
+                yield lines
+            yield summary(reader, rows, start, model.model_version)
+        finally:
+            f.close()
+            executor.release()
+
+    return StreamingResponse(
+        results(),
+        media_type=media,
+        headers={'X-Model-Version': str(model.model_version), 'X-Model-Tier': tier}
+    )
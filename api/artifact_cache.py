@@ -0,0 +1,138 @@
+import os
+import json
+import shutil
+import hashlib
+import logging
+import tempfile
+
+
+ARTIFACT_CACHE_DIR = os.environ.get('ARTIFACT_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'model_cache'))
+ARTIFACT_CACHE_MAX_MB = float(os.environ.get('ARTIFACT_CACHE_MAX_MB', 1024))
+MANIFEST = 'manifest.json'
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _files(root):
+    for dirpath, _, filenames in os.walk(root):
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            rel = os.path.relpath(path, root)
+            if rel != MANIFEST:
+                yield rel, path
+
+
+class ArtifactCache:
+    # Local copies of registered model artifacts, one directory per
+    # <model name>/<version>. Each directory carries a manifest with the
+    # sha256 of every file; an entry that fails validation is discarded and
+    # downloaded again. Least recently used versions are evicted once the
+    # cache grows past max_mb.
+
+    def __init__(self, root=ARTIFACT_CACHE_DIR, max_mb=ARTIFACT_CACHE_MAX_MB):
+        self.root = root
+        self.max_bytes = max_mb * 1024 * 1024
+
+    def path(self, model_name, version):
+        return os.path.join(self.root, model_name, str(version))
+
+    def versions(self, model_name):
+        model_dir = os.path.join(self.root, model_name)
+        if not os.path.isdir(model_dir):
+            return []
+        return sorted(
+            (v for v in os.listdir(model_dir) if v.isdigit() and os.path.exists(os.path.join(model_dir, v, MANIFEST))),
+            key=int
+        )
+
+    def latest_version(self, model_name):
+        for version in reversed(self.versions(model_name)):
+            if self.get(model_name, version) is not None:
+                return version
+        return None
+
+    def get(self, model_name, version):
+        path = self.path(model_name, version)
+        try:
+            with open(os.path.join(path, MANIFEST)) as f:
+                manifest = json.load(f)
+            for rel, checksum in manifest['files'].items():
+                if _sha256(os.path.join(path, rel)) != checksum:
+                    raise ValueError(f'checksum mismatch for {rel}')
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logging.error(f'Discarding cached artifact {model_name}/{version}: {e}')
+            shutil.rmtree(path, ignore_errors=True)
+            return None
+        # mtime of the manifest tracks the last use, for LRU eviction
+        os.utime(os.path.join(path, MANIFEST))
+        return path
+
+    def fetch(self, model_name, version):
+        path = self.get(model_name, version)
+        if path is not None:
+            logging.warning(f'... Using cached artifact for {model_name} version {version} ...')
+            return path
+        logging.warning(f'... Downloading artifact for {model_name} version {version} ...')
+        os.makedirs(os.path.join(self.root, model_name), exist_ok=True)
+        staging = tempfile.mkdtemp(dir=os.path.join(self.root, model_name), prefix='.download-')
+        try:
+            import mlflow
+
+            mlflow.artifacts.download_artifacts(
+                artifact_uri=f'models:/{model_name}/{version}',
+                dst_path=staging
+            )
+            files = {rel: _sha256(path) for rel, path in _files(staging)}
+            size = sum(os.path.getsize(path) for _, path in _files(staging))
+            with open(os.path.join(staging, MANIFEST), 'w') as f:
+                json.dump({'model_name': model_name, 'version': str(version), 'size': size, 'files': files}, f)
+            path = self.path(model_name, version)
+            # Only an entry that fails validation is removed: a valid one may
+            # have just been renamed in place by another worker, which could
+            # be loading it.
+            if os.path.exists(path) and self.get(model_name, version) is None:
+                shutil.rmtree(path, ignore_errors=True)
+            try:
+                os.rename(staging, path)
+            except OSError:
+                # Another process won the race to this version: keep its copy
+                if self.get(model_name, version) is None:
+                    raise
+                shutil.rmtree(staging, ignore_errors=True)
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        self.evict(keep=path)
+        return path
+
+    def evict(self, keep=None):
+        entries = []
+        for model_name in os.listdir(self.root):
+            for version in self.versions(model_name):
+                path = self.path(model_name, version)
+                try:
+                    with open(os.path.join(path, MANIFEST)) as f:
+                        size = json.load(f)['size']
+                    entries.append((os.path.getmtime(os.path.join(path, MANIFEST)), size, path))
+                except Exception:
+                    continue
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            logging.warning(f'... Evicting cached artifact {path} ...')
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+
+
+artifact_cache = ArtifactCache()
@@ -0,0 +1,167 @@
+import os
+import asyncio
+import logging
+from itertools import chain
+from metrics import Histogram
+
+
+BATCH_MAX_SIZE = int(os.environ.get('BATCH_MAX_SIZE', 256))
+BATCH_MAX_WAIT_MS = float(os.environ.get('BATCH_MAX_WAIT_MS', 2))
+
+
+def size_buckets(max_size):
+    # Powers of two up to max_size
+    buckets = [1]
+    while buckets[-1] < max_size:
+        buckets.append(buckets[-1] * 2)
+    return buckets
+
+
+class MicroBatcher:
+    # Coalesces concurrent /predict payloads into a single model call. A batch
+    # is flushed once it holds max_batch_size rows or max_wait_ms has passed
+    # since its first request arrived, whichever comes first. With an
+    # executor, up to executor.workers batches run at once; while they are
+    # all busy the next batch keeps filling up in the queue.
+
+    def __init__(self, predict, max_batch_size=BATCH_MAX_SIZE, max_wait_ms=BATCH_MAX_WAIT_MS, executor=None):
+        self.predict = predict
+        self.executor = executor
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.queue = None
+        self.batch_sizes = Histogram('batch_rows', 'Rows per micro-batch', size_buckets(max_batch_size))
+        self.request_counts = Histogram('batch_requests', 'Requests per micro-batch', size_buckets(max_batch_size))
+        self._task = None
+        self._getter = None
+        self._slots = None
+        self._flushes = set()
+
+    def start(self):
+        self.queue = asyncio.Queue()
+        self._slots = asyncio.Semaphore(self.executor.workers if self.executor else 1)
+        self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        for flush in self._flushes:
+            flush.cancel()
+
+    async def submit(self, x):
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((x, future))
+        return await future
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        pending = None
+        # The queue getter outlives a timed-out wait instead of being
+        # cancelled, so an item it already dequeued can't be lost.
+        self._getter = None
+        try:
+            while True:
+                await self._slots.acquire()
+                if pending is None:
+                    pending = await self._next(None)
+                batch = [pending]
+                size = _n_rows(pending[0])
+                pending = None
+                deadline = loop.time() + self.max_wait
+                while size < self.max_batch_size:
+                    item = await self._next(max(deadline - loop.time(), 0))
+                    if item is None:
+                        break
+                    if size + _n_rows(item[0]) > self.max_batch_size:
+                        pending = item
+                        break
+                    batch.append(item)
+                    size += _n_rows(item[0])
+                flush = asyncio.create_task(self._flush(batch, size))
+                self._flushes.add(flush)
+                flush.add_done_callback(self._flushes.discard)
+        finally:
+            if self._getter is not None:
+                self._getter.cancel()
+
+    async def _next(self, timeout):
+        if self._getter is None:
+            try:
+                return self.queue.get_nowait()
+            except asyncio.QueueEmpty:
+                self._getter = asyncio.ensure_future(self.queue.get())
+        done, _ = await asyncio.wait({self._getter}, timeout=timeout)
+        if not done:
+            return None
+        item = self._getter.result()
+        self._getter = None
+        return item
+
+    async def _flush(self, batch, size):
+        try:
+            await self._flush_batch(batch, size)
+        finally:
+            self._slots.release()
+
+    async def _flush_batch(self, batch, size):
+        # Callers that gave up (deadline or disconnect) are dropped here.
+        batch = [(x, future) for x, future in batch if not future.done()]
+        if not batch:
+            return
+        size = sum(_n_rows(x) for x, _ in batch)
+        self.batch_sizes.observe(size)
+        self.request_counts.observe(len(batch))
+        try:
+            # A request alone in its batch, typically a large one, is passed
+            # as is: copying its columns would hold up the event loop.
+            columns = batch[0][0] if len(batch) == 1 else {
+                col: list(chain.from_iterable(x[col] for x, _ in batch))
+                for col in batch[0][0]
+            }
+            prediction, model_version = await self._predict(columns)
+        except Exception as e:
+            logging.error(f'Error predicting batch of {size} rows: {e}')
+            if len(batch) > 1:
+                await self._predict_each(batch)
+            elif not batch[0][1].done():
+                batch[0][1].set_exception(e)
+            return
+        start = 0
+        for x, future in batch:
+            end = start + _n_rows(x)
+            if not future.done():
+                future.set_result((prediction[start:end], model_version))
+            start = end
+
+    async def _predict_each(self, batch):
+        # One bad payload must not fail the requests it was coalesced with:
+        # score them one by one, so only its own caller gets the error.
+        for x, future in batch:
+            if future.done():
+                continue
+            try:
+                result = await self._predict(x)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+                continue
+            if not future.done():
+                future.set_result(result)
+
+    async def _predict(self, columns):
+        if self.executor is None:
+            return self.predict(columns)
+        return await self.executor.run(self.predict, columns)
+
+    def stats(self):
+        return {
+            'max_batch_size': self.max_batch_size,
+            'max_wait_ms': self.max_wait * 1000,
+            'batch_rows': self.batch_sizes.to_dict(),
+            'batch_requests': self.request_counts.to_dict(),
+        }
+
+
+def _n_rows(x):
+    return len(next(iter(x.values())))
@@ -0,0 +1,200 @@
+import os
+import io
+import csv
+import json
+import math
+import time
+import tempfile
+from common.schema import PRICING_FEATURES as FEATURES, PRICING_NUMERIC as SCALE_COLUMNS, PRICING_BOOL as BOOL_COLUMNS
+from metrics import metrics
+
+
+BULK_CHUNK_SIZE = int(os.environ.get('BULK_CHUNK_SIZE', 10000))
+
+CSV_TYPES = ('text/csv', 'application/csv')
+NDJSON_TYPES = ('application/x-ndjson', 'application/ndjson', 'application/jsonl')
+
+
+TRUE_VALUES = ('true', '1', 'yes')
+FALSE_VALUES = ('false', '0', 'no')
+
+
+def parse_bool(value):
+    if isinstance(value, bool):
+        return value
+    text = str(value).strip().lower()
+    if text in TRUE_VALUES:
+        return True
+    if text in FALSE_VALUES:
+        return False
+    raise ValueError(f'expected a boolean, got {value!r}')
+
+
+def parse_number(value):
+    if isinstance(value, bool):
+        raise ValueError(f'expected a number, got {value!r}')
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'expected a number, got {value!r}')
+    if not math.isfinite(number):
+        raise ValueError(f'expected a finite number, got {value!r}')
+    return number
+
+
+def parse_text(value):
+    if not isinstance(value, (str, int, float)) or isinstance(value, bool) or value == '':
+        raise ValueError(f'expected a non-empty string, got {value!r}')
+    return str(value)
+
+
+def parse_json(line):
+    try:
+        return json.loads(line)
+    except ValueError as e:
+        raise ValueError(f'invalid JSON: {e}')
+
+
+def parse_record(record):
+    # One car's features, or a ValueError naming the first bad one
+    if not isinstance(record, dict):
+        raise ValueError(f'expected an object, got {type(record).__name__}')
+    values = {}
+    for col in FEATURES:
+        # DictReader fills the fields of a short line with None
+        if record.get(col) is None:
+            raise ValueError(f'{col}: missing')
+        try:
+            if col in SCALE_COLUMNS:
+                values[col] = parse_number(record[col])
+            elif col in BOOL_COLUMNS:
+                values[col] = parse_bool(record[col])
+            else:
+                values[col] = parse_text(record[col])
+        except ValueError as e:
+            raise ValueError(f'{col}: {e}')
+    return values
+
+
+def media_type(content_type):
+    content_type = (content_type or '').split(';')[0].strip().lower()
+    if content_type in CSV_TYPES:
+        return 'text/csv'
+    if content_type in NDJSON_TYPES:
+        return 'application/x-ndjson'
+    return None
+
+
+async def spool(stream):
+    # The upload is spooled to disk before scoring starts, so the request
+    # body and the streamed response never compete for the ASGI receive
+    # channel, and memory stays bounded by the chunk size.
+    f = tempfile.TemporaryFile()
+    async for chunk in stream:
+        f.write(chunk)
+    f.seek(0)
+    return f
+
+
+class BulkReader:
+    def __init__(self, f, media, chunk_size=BULK_CHUNK_SIZE):
+        self.media = media
+        self.chunk_size = chunk_size
+        self.text = io.TextIOWrapper(f, encoding='utf-8', newline='')
+        self.row = 0
+        self.errors = 0
+        self.id_column = None
+        if media == 'text/csv':
+            self.reader = csv.DictReader(self.text)
+            fieldnames = self.reader.fieldnames or []
+            missing = [col for col in FEATURES if col not in fieldnames]
+            if missing:
+                raise ValueError(f'Missing columns: {missing}')
+            # get_around_pricing_project.csv starts with an unnamed index column
+            if fieldnames and fieldnames[0] == '':
+                self.id_column = ''
+        else:
+            self.reader = (line for line in self.text if line.strip())
+            self.id_column = 'id'
+
+    def next_chunk(self):
+        # Every row is validated on its own: a bad one gets an error in the
+        # output instead of aborting the rest of the file.
+        ids, errors = [], {}
+        columns = {col: [] for col in FEATURES}
+        for line in self.reader:
+            record = line
+            try:
+                if self.media != 'text/csv':
+                    record = parse_json(line)
+                values = parse_record(record)
+            except ValueError as e:
+                errors[len(ids)] = str(e)
+            else:
+                for col in FEATURES:
+                    columns[col].append(values[col])
+            row = self.row + len(ids)
+            ids.append(record.get(self.id_column, row) if isinstance(record, dict) else row)
+            if len(ids) == self.chunk_size:
+                break
+        if not ids:
+            return None
+        self.row += len(ids)
+        self.errors += len(errors)
+        return ids, columns, errors
+
+
+def score_chunk(model, reader):
+    with metrics.time('decode'):
+        chunk = reader.next_chunk()
+    if chunk is None:
+        return None
+    ids, columns, errors = chunk
+    n_rows = len(ids) - len(errors)
+    predictions = iter(model(columns).tolist() if n_rows else [])
+    with metrics.time('serialize'):
+        if reader.media == 'text/csv':
+            # csv.writer quotes ids and errors holding commas or quotes
+            out = io.StringIO()
+            writer = csv.writer(out, lineterminator='\n')
+            writer.writerows(
+                (i, '', errors[position]) if position in errors else (i, next(predictions), '')
+                for position, i in enumerate(ids)
+            )
+            return n_rows, out.getvalue()
+        lines = []
+        for position, i in enumerate(ids):
+            if position in errors:
+                lines.append(json.dumps({'id': i, 'error': errors[position]}) + '\n')
+            else:
+                lines.append(json.dumps({'id': i, 'prediction': next(predictions)}) + '\n')
+        return n_rows, ''.join(lines)
+
+
+def csv_field(text):
+    return '"' + text.replace('"', '""') + '"'
+
+
+def header(reader):
+    return 'id,prediction,error\n' if reader.media == 'text/csv' else ''
+
+
+def summary(reader, rows, start, model_version):
+    seconds = time.perf_counter() - start
+    stats = {
+        'rows': rows,
+        'errors': reader.errors,
+        'seconds': round(seconds, 3),
+        'rows_per_second': round(rows / seconds, 1) if seconds else 0,
+        'model_version': model_version,
+    }
+    if reader.media == 'text/csv':
+        return '# ' + ','.join(f'{k}={v}' for k, v in stats.items()) + '\n'
+    return json.dumps({'summary': stats}) + '\n'
+
+
+def failure(reader, error, rows):
+    # A chunk the model itself failed on ends the stream, in its own format
+    if reader.media == 'text/csv':
+        return f'# error={csv_field(str(error))},rows={rows}\n'
+    return json.dumps({'error': str(error), 'rows': rows}) + '\n'
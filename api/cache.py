@@ -0,0 +1,120 @@
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+from common.schema import PRICING_FEATURES as FEATURES
+from metrics import metrics
+
+
+CACHE_MAX_MB = float(os.environ.get('CACHE_MAX_MB', 32))
+CACHE_TTL_S = float(os.environ.get('CACHE_TTL_S', 3600))
+CACHE_MILEAGE_BUCKET = int(os.environ.get('CACHE_MILEAGE_BUCKET', 0))
+# Approximate footprint of one entry: 16-byte digest key, (float, expiry)
+# tuple and the OrderedDict node holding them.
+ENTRY_BYTES = 200
+
+
+class PredictionCache:
+    # LRU + TTL cache of single-car predictions. Keys are a digest of the
+    # canonical 13 features; the whole cache is dropped when the serving
+    # model version changes, so a stale price is never returned.
+
+    def __init__(self, max_mb=CACHE_MAX_MB, ttl=CACHE_TTL_S, mileage_bucket=CACHE_MILEAGE_BUCKET):
+        self.max_entries = int(max_mb * 1024 * 1024 / ENTRY_BYTES)
+        self.ttl = ttl
+        self.mileage_bucket = mileage_bucket
+        self.model_version = None
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    def key(self, row):
+        values = []
+        for col, value in zip(FEATURES, row):
+            if isinstance(value, (bool, np.bool_)):
+                value = bool(value)
+            elif isinstance(value, (int, float, np.number)):
+                value = float(value)
+                if col == 'mileage' and self.mileage_bucket > 1:
+                    value = float(value // self.mileage_bucket)
+                if value.is_integer():
+                    value = int(value)
+            else:
+                value = str(value)
+            values.append(value)
+        return hashlib.blake2b(repr(values).encode(), digest_size=16).digest()
+
+    def predict(self, model, x):
+        with metrics.time('cache_lookup'):
+            prediction, keys, misses, now = self._lookup(model, x)
+        if not misses:
+            return prediction
+        if len(misses) == len(keys):
+            computed = model(x)
+        else:
+            computed = model({col: [x[col][i] for i in misses] for col in x})
+        prediction[misses] = computed
+        expires = now + self.ttl
+        with self._lock:
+            if model.model_version == self.model_version:
+                for i, value in zip(misses, computed.tolist()):
+                    self.entries[keys[i]] = (value, expires)
+                    self.entries.move_to_end(keys[i])
+                while len(self.entries) > self.max_entries:
+                    self.entries.popitem(last=False)
+                    self.evictions += 1
+        return prediction
+
+    def _lookup(self, model, x):
+        keys = [self.key(row) for row in zip(*(x[col] for col in FEATURES))]
+        prediction = np.empty(len(keys), dtype=np.float32)
+        misses = []
+        now = time.monotonic()
+        with self._lock:
+            if model.model_version != self.model_version:
+                self._invalidate(model.model_version)
+            for i, key in enumerate(keys):
+                entry = self.entries.get(key)
+                if entry is not None and entry[1] < now:
+                    del self.entries[key]
+                    self.expirations += 1
+                    entry = None
+                if entry is None:
+                    misses.append(i)
+                else:
+                    self.entries.move_to_end(key)
+                    prediction[i] = entry[0]
+            self.hits += len(keys) - len(misses)
+            self.misses += len(misses)
+        return prediction, keys, misses, now
+
+    def _invalidate(self, model_version):
+        if self.entries:
+            self.invalidations += 1
+        self.entries.clear()
+        self.model_version = model_version
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'model_version': self.model_version,
+            'entries': len(self.entries),
+            'max_entries': self.max_entries,
+            'ttl_s': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / lookups if lookups else 0,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'invalidations': self.invalidations,
+        }
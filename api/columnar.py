@@ -0,0 +1,88 @@
+import numpy as np
+from common.schema import (
+    PRICING_CATEGORICAL as OHE_COLUMNS, PRICING_NUMERIC as SCALE_COLUMNS, PRICING_BOOL as BOOL_COLUMNS
+)
+from fast import Codes
+from metrics import metrics
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+except ImportError:
+    pa = None
+
+
+ARROW_STREAM = 'application/vnd.apache.arrow.stream'
+
+
+def is_arrow(content_type):
+    return (content_type or '').split(';')[0].strip().lower() == ARROW_STREAM
+
+
+def accepts_arrow(accept):
+    return ARROW_STREAM in (accept or '').lower()
+
+
+def read_table(body):
+    if pa is None:
+        raise ValueError('pyarrow is not installed on this server')
+    try:
+        table = pa.ipc.open_stream(body).read_all()
+    except pa.ArrowException as e:
+        raise ValueError(f'Invalid Arrow IPC stream: {e}')
+    errors = []
+    for col in OHE_COLUMNS + SCALE_COLUMNS + BOOL_COLUMNS:
+        if col not in table.column_names:
+            errors.append(f'{col}: missing')
+            continue
+        column = table[col]
+        kind = column.type
+        if pa.types.is_dictionary(kind):
+            kind = kind.value_type
+        if col in OHE_COLUMNS and not (pa.types.is_string(kind) or pa.types.is_large_string(kind)):
+            errors.append(f'{col}: expected string, got {column.type}')
+        elif col in SCALE_COLUMNS and not (pa.types.is_integer(kind) or pa.types.is_floating(kind)):
+            errors.append(f'{col}: expected number, got {column.type}')
+        elif col in BOOL_COLUMNS and not pa.types.is_boolean(kind):
+            errors.append(f'{col}: expected bool, got {column.type}')
+        elif column.null_count:
+            errors.append(f'{col}: {column.null_count} null values')
+    if errors:
+        raise ValueError('; '.join(errors))
+    return table
+
+
+def to_columns(table, compiled):
+    # Whole-column conversions only: numeric columns are zero-copy views and
+    # categorical columns are resolved against the fitted vocabulary inside
+    # Arrow, so no Python object is created per row.
+    x = {}
+    for col in OHE_COLUMNS:
+        column = table[col]
+        if pa.types.is_dictionary(column.type):
+            column = column.cast(column.type.value_type)
+        if compiled is None:
+            x[col] = column.to_numpy()
+        else:
+            codes = pc.index_in(column, value_set=pa.array(compiled.categories[col]))
+            x[col] = Codes(codes.fill_null(-1).to_numpy())
+    for col in SCALE_COLUMNS + BOOL_COLUMNS:
+        x[col] = table[col].to_numpy()
+    return x
+
+
+def predict_table(model, table):
+    with metrics.time('columns'):
+        x = to_columns(table, model.compiled)
+    return model(x), model.model_version
+
+
+def write_prediction(prediction, model_version):
+    table = pa.table(
+        {'prediction': pa.array(np.asarray(prediction, dtype=np.float32))},
+        metadata={'model_version': str(model_version)}
+    )
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
@@ -0,0 +1,64 @@
+import os
+import asyncio
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+
+INFERENCE_WORKERS = int(os.environ.get('INFERENCE_WORKERS', 2))
+MAX_PENDING_REQUESTS = int(os.environ.get('MAX_PENDING_REQUESTS', 64))
+REQUEST_TIMEOUT_MS = float(os.environ.get('REQUEST_TIMEOUT_MS', 5000))
+RETRY_AFTER = int(os.environ.get('RETRY_AFTER', 1))
+
+
+class Overloaded(Exception):
+    pass
+
+
+class InferenceExecutor:
+    # Runs model calls on a bounded thread pool so the event loop keeps
+    # serving other requests. XGBoost releases the GIL while predicting, so
+    # threads are enough and the model doesn't need to be pickled to workers.
+
+    def __init__(self, workers=INFERENCE_WORKERS, max_pending=MAX_PENDING_REQUESTS):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.pending = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.pool = None
+
+    def start(self):
+        self.pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='inference')
+
+    def acquire(self):
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise Overloaded()
+        self.pending += 1
+
+    def release(self):
+        self.pending -= 1
+
+    @contextmanager
+    def admit(self):
+        self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    async def run(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.pool, fn, *args)
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self):
+        return {
+            'workers': self.workers,
+            'max_pending': self.max_pending,
+            'pending': self.pending,
+            'rejected': self.rejected,
+            'timed_out': self.timed_out,
+        }
@@ -0,0 +1,146 @@
+import sys
+import logging
+import numpy as np
+from metrics import metrics
+
+
+class Codes:
+    # Category indices already resolved against CompiledModel.categories,
+    # -1 for values outside the fitted vocabulary.
+    def __init__(self, codes):
+        self.codes = np.asarray(codes)
+
+
+class CompiledModel:
+    # Encodes request columns straight into a float32 matrix from the fitted
+    # OneHotEncoder/StandardScaler parameters and calls the booster directly,
+    # skipping the DataFrame and ColumnTransformer on the request path.
+
+    def __init__(self, spec, booster):
+        # spec holds the fitted encoding as plain lists and numbers (see
+        # from_pipeline), so it can be saved next to the booster and loaded
+        # back without sklearn.
+        self.ohe_columns = []
+        self.categories = {}
+        offset = 0
+        for col, categories in spec['ohe']:
+            categories = np.asarray(categories).astype(str)
+            self.ohe_columns.append((col, categories, offset))
+            self.categories[col] = categories
+            offset += len(categories)
+
+        self.scale_columns = []
+        for col, m, s in spec['standard']:
+            self.scale_columns.append((col, m, s, offset))
+            offset += 1
+
+        self.passthrough_columns = []
+        for col in spec['passthrough']:
+            self.passthrough_columns.append((col, offset))
+            offset += 1
+
+        self.spec = spec
+        self.n_features = offset
+        self.booster = booster
+        self.iteration_range = tuple(spec['iteration_range'])
+        self.missing = spec['missing']
+
+    @classmethod
+    def from_pipeline(cls, pipeline):
+        preprocessing = pipeline.named_steps['preprocessing']
+        regressor = pipeline.named_steps['model']
+        ohe_transformer = preprocessing.named_transformers_['ohe'].named_steps['ohe']
+        scaler = preprocessing.named_transformers_['standard'].named_steps['scaler']
+        names_in = list(preprocessing.feature_names_in_)
+        mean = scaler.mean_ if scaler.with_mean else np.zeros(scaler.n_features_in_)
+        scale = scaler.scale_ if scaler.with_std else np.ones(scaler.n_features_in_)
+        best_iteration = getattr(regressor, 'best_iteration', None)
+        spec = {
+            'ohe': [
+                [col, np.asarray(categories).astype(str).tolist()]
+                for col, categories in zip(cls._columns(preprocessing, 'ohe', names_in), ohe_transformer.categories_)
+            ],
+            'standard': [
+                [col, float(m), float(s)]
+                for col, m, s in zip(cls._columns(preprocessing, 'standard', names_in), mean, scale)
+            ],
+            'passthrough': cls._columns(preprocessing, 'remainder', names_in),
+            'iteration_range': [0, best_iteration + 1] if best_iteration is not None else [0, 0],
+            # When the ColumnTransformer output was sparse, XGBoost saw every
+            # zero as a missing value during training and in Pipeline.predict.
+            # Treating 0 as missing on the dense matrix reproduces that exactly.
+            'missing': 0.0 if preprocessing.sparse_output_ else float(regressor.missing),
+        }
+        return cls(spec, regressor.get_booster())
+
+    @staticmethod
+    def _columns(preprocessing, name, names_in):
+        for transformer_name, _, columns in preprocessing.transformers_:
+            if transformer_name == name:
+                return [names_in[c] if isinstance(c, (int, np.integer)) else c for c in columns]
+        return []
+
+    def codes(self, col, values):
+        if isinstance(values, Codes):
+            return values.codes
+        categories = self.categories[col]
+        values = np.asarray(values).astype(str)
+        # categories_ is sorted, unknown values get -1
+        idx = np.searchsorted(categories, values).clip(max=len(categories) - 1)
+        return np.where(categories[idx] == values, idx, -1)
+
+    def transform(self, x):
+        n_rows = len(x[self.scale_columns[0][0]])
+        X = np.zeros((n_rows, self.n_features), dtype=np.float32)
+        rows = np.arange(n_rows)
+        for col, categories, offset in self.ohe_columns:
+            idx = self.codes(col, x[col])
+            known = idx >= 0
+            X[rows[known], offset + idx[known]] = 1.0
+        for col, mean, scale, offset in self.scale_columns:
+            X[:, offset] = (np.asarray(x[col], dtype=np.float64) - mean) / scale
+        for col, offset in self.passthrough_columns:
+            X[:, offset] = np.asarray(x[col], dtype=np.float64)
+        return X
+
+    def predict(self, X):
+        return self.booster.inplace_predict(
+            X,
+            iteration_range=self.iteration_range,
+            missing=self.missing,
+            validate_features=False,
+        )
+
+    def __call__(self, x):
+        with metrics.time('preprocess'):
+            X = self.transform(x)
+        with metrics.time('predict'):
+            return self.predict(X)
+
+
+def compile_pipeline(pipeline):
+    try:
+        return CompiledModel.from_pipeline(pipeline)
+    except Exception as e:
+        logging.error(f'Error compiling pipeline, falling back to Pipeline.predict: {e}')
+        return None
+
+
+def check_parity(pipeline, compiled, X, rtol=1e-5, atol=1e-3):
+    expected = pipeline.predict(X)
+    got = compiled({col: X[col].to_numpy() for col in X.columns})
+    max_diff = float(np.max(np.abs(expected - got)))
+    return np.allclose(expected, got, rtol=rtol, atol=atol), max_diff
+
+
+if __name__ == '__main__':
+    from model import Model
+    from common.schema import PRICING_TARGET, read_pricing_csv
+
+    model = Model()
+    compiled = CompiledModel.from_pipeline(model.model)
+    data = read_pricing_csv('get_around_pricing_project.csv')
+    X = data.drop(PRICING_TARGET, axis=1)
+    ok, max_diff = check_parity(model.model, compiled, X)
+    print(f'parity on {len(X)} rows: {ok} (max abs diff {max_diff:.2e})')
+    sys.exit(0 if ok else 1)
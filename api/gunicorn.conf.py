@@ -0,0 +1,27 @@
+import os
+import gc
+
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 8000)}"
+worker_class = 'uvicorn.workers.UvicornWorker'
+workers = int(os.environ.get('WEB_CONCURRENCY', 1))
+# Import the app, and load the model, once in the master process: forked
+# workers then share the booster's memory copy-on-write instead of each
+# downloading and deserializing their own copy.
+preload_app = os.environ.get('PRELOAD_MODEL', '1') == '1'
+
+
+def on_starting(server):
+    if not preload_app:
+        return
+    from holder import holder
+    try:
+        # No warm-up here: libgomp (used by XGBoost) is not fork-safe once
+        # its thread pool has started, so the first prediction has to
+        # happen in the workers.
+        holder.load(warm_up=False)
+    except Exception as e:
+        server.log.error(f'Error preloading model: {e}')
+    # Keep the preloaded objects out of the GC's reach so collections in
+    # the workers don't write to, and un-share, their pages.
+    gc.freeze()
@@ -0,0 +1,129 @@
+import os
+import json
+import asyncio
+import hashlib
+import logging
+from cache import PredictionCache
+
+
+POLL_INTERVAL = float(os.environ.get('MODEL_POLL_INTERVAL', 60))
+# Directories exported by serving.py, for the accurate and the fast tier.
+# When set, the API serves them without importing mlflow, sklearn or
+# pandas, and doesn't watch the registry.
+SERVING_ARTIFACT = os.environ.get('SERVING_ARTIFACT')
+SERVING_ARTIFACT_FAST = os.environ.get('SERVING_ARTIFACT_FAST')
+# Latency/accuracy tiers, see model.train_tiers. The first one is required
+# and used by default.
+TIERS = ('accurate', 'fast')
+DEFAULT_TIER = TIERS[0]
+
+if SERVING_ARTIFACT:
+    from serving import ServingModel
+else:
+    from model import Model, TIER_MODEL_NAMES, get_latest_version
+    from artifact_cache import artifact_cache
+
+
+class ModelHolder:
+    # One model and one prediction cache per tier. Until a version of an
+    # optional tier is available, its requests go to the default tier.
+
+    def __init__(self):
+        self.models = {}
+        self.caches = {tier: PredictionCache() for tier in TIERS}
+        self._metadata = None
+
+    def load(self, warm_up=True):
+        # Start from the newest locally cached version without waiting on
+        # the registry; watch() checks the registry right after startup.
+        # The default tier comes first: when nothing is registered it
+        # trains and registers every tier.
+        for tier in TIERS:
+            model = self._load(tier)
+            if model is None:
+                continue
+            if warm_up:
+                model.warm_up()
+            self.swap(tier, model)
+
+    def _load(self, tier):
+        if SERVING_ARTIFACT:
+            path = {'accurate': SERVING_ARTIFACT, 'fast': SERVING_ARTIFACT_FAST}[tier]
+            return ServingModel(path) if path else None
+        model_name = TIER_MODEL_NAMES[tier]
+        try:
+            return Model(artifact_cache.latest_version(model_name), model_name)
+        except LookupError as e:
+            logging.warning(f'... {e}: {tier} requests use the {DEFAULT_TIER} tier ...')
+            return None
+
+    def swap(self, tier, model):
+        # A single reference assignment: requests that already grabbed the
+        # previous model keep using it until they return.
+        self.models[tier] = model
+        logging.warning(f'... Serving {model.model_name} version {model.model_version} as {tier} ...')
+
+    @property
+    def model(self):
+        return self.models.get(DEFAULT_TIER)
+
+    @property
+    def ready(self):
+        return self.model is not None
+
+    @property
+    def model_version(self):
+        if self.model is None:
+            return None
+        return self.model.model_version
+
+    def versions(self):
+        return {tier: model.model_version for tier, model in self.models.items()}
+
+    def resolve(self, tier):
+        # The tier that will serve a request for `tier`
+        return tier if tier in self.models else DEFAULT_TIER
+
+    def predict(self, x, tier=DEFAULT_TIER):
+        model = self.models[tier]
+        cache = self.caches[tier]
+        if cache.enabled:
+            return cache.predict(model, x), model.model_version
+        return model(x), model.model_version
+
+    def metadata(self):
+        # Serialized once per model, with an ETag derived from the body
+        model = self.model
+        if self._metadata is None or self._metadata[0] is not model:
+            body = json.dumps(model.metadata(), sort_keys=True).encode()
+            etag = '"' + hashlib.blake2b(body, digest_size=8).hexdigest() + '"'
+            self._metadata = (model, body, etag)
+        return model.model_version, self._metadata[1], self._metadata[2]
+
+    async def watch(self, interval=POLL_INTERVAL):
+        if SERVING_ARTIFACT:
+            # Pinned to the exported version: a new one ships as a new artifact
+            return
+        while True:
+            await self.refresh()
+            if interval <= 0:
+                return
+            await asyncio.sleep(interval)
+
+    async def refresh(self):
+        for tier in TIERS:
+            model_name = TIER_MODEL_NAMES[tier]
+            try:
+                version = await asyncio.to_thread(get_latest_version, model_name)
+                current = self.models.get(tier)
+                if version is None or (current is not None and version == current.model_version):
+                    continue
+                logging.warning(f'... New {model_name} version {version} found in registry ...')
+                model = await asyncio.to_thread(Model, version, model_name)
+                await asyncio.to_thread(model.warm_up)
+                self.swap(tier, model)
+            except Exception as e:
+                logging.error(f'Error refreshing {tier} model from registry: {e}')
+
+
+holder = ModelHolder()
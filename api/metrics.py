@@ -0,0 +1,189 @@
+import os
+import time
+import random
+import logging
+import resource
+import threading
+from contextlib import contextmanager
+
+
+PAYLOAD_LOG_SAMPLE_RATE = float(os.environ.get('PAYLOAD_LOG_SAMPLE_RATE', 0))
+STAGE_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+REQUEST_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+LOAD_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+ROW_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 4096, 16384)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+payload_logger = logging.getLogger('payload')
+
+
+def _labels(names, values):
+    if not names:
+        return ''
+    return '{' + ','.join(f'{n}="{v}"' for n, v in zip(names, values)) + '}'
+
+
+class Histogram:
+    # Prometheus histogram, one series per label combination. Observations
+    # come from the event loop and from the inference threads.
+
+    def __init__(self, name, documentation, buckets, label_names=()):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        self.label_names = tuple(label_names)
+        self.series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        i = 0
+        while i < len(self.buckets) and value > self.buckets[i]:
+            i += 1
+        with self._lock:
+            series = self.series.get(label_values)
+            if series is None:
+                series = self.series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][i] += 1
+            series[1] += value
+
+    def to_dict(self, *label_values):
+        # One series as JSON, for the /stats endpoints
+        with self._lock:
+            counts, total = self.series.get(label_values, [[0] * (len(self.buckets) + 1), 0])
+            counts = list(counts)
+        histogram = {f'le_{bound}': count for bound, count in zip(self.buckets, counts)}
+        histogram['le_inf'] = counts[-1]
+        observations = sum(counts)
+        return {
+            'count': observations,
+            'sum': total,
+            'mean': total / observations if observations else 0,
+            'histogram': histogram,
+        }
+
+    def render(self):
+        yield f'# HELP {self.name} {self.documentation}'
+        yield f'# TYPE {self.name} histogram'
+        with self._lock:
+            series = [(k, list(counts), total) for k, (counts, total) in self.series.items()]
+        for label_values, counts, total in sorted(series):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                labels = _labels(self.label_names + ('le',), label_values + (bound,))
+                yield f'{self.name}_bucket{labels} {cumulative}'
+            labels = _labels(self.label_names, label_values)
+            yield f'{self.name}_sum{labels} {total}'
+            yield f'{self.name}_count{labels} {cumulative}'
+
+
+class Metrics:
+    # Latency of every /predict stage, model loading steps and batch sizes,
+    # plus gauges read when /metrics is scraped. Per process: with several
+    # gunicorn workers each one reports its own series.
+
+    def __init__(self):
+        self.stage_seconds = Histogram(
+            'prediction_stage_seconds', 'Time spent in each stage of a prediction',
+            STAGE_BUCKETS, ('stage',)
+        )
+        self.request_seconds = Histogram(
+            'http_request_duration_seconds', 'HTTP request latency, until the last byte of the response',
+            REQUEST_BUCKETS, ('method', 'path', 'status')
+        )
+        self.batch_rows = Histogram('prediction_batch_rows', 'Rows per model call', ROW_BUCKETS)
+        self.model_load_seconds = Histogram(
+            'model_load_seconds', 'Time spent in each model loading step', LOAD_BUCKETS, ('step',)
+        )
+        self.gauges = []
+
+    @contextmanager
+    def time(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stage_seconds.observe(time.perf_counter() - start, stage)
+
+    @contextmanager
+    def time_load(self, step):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.model_load_seconds.observe(time.perf_counter() - start, step)
+
+    def gauge(self, name, documentation, read, kind='gauge'):
+        # read() returns a number, or a dict of {label string: number}
+        self.gauges.append((name, documentation, read, kind))
+
+    def render(self):
+        lines = []
+        for histogram in (self.request_seconds, self.stage_seconds, self.batch_rows, self.model_load_seconds):
+            lines.extend(histogram.render())
+        for name, documentation, read, kind in self.gauges:
+            try:
+                values = read()
+            except Exception as e:
+                logging.error(f'Error reading metric {name}: {e}')
+                continue
+            lines.append(f'# HELP {name} {documentation}')
+            lines.append(f'# TYPE {name} {kind}')
+            if isinstance(values, dict):
+                lines.extend(f'{name}{labels} {value}' for labels, value in values.items())
+            else:
+                lines.append(f'{name} {values}')
+        return '\n'.join(lines) + '\n'
+
+
+def resident_memory_bytes():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * resource.getpagesize()
+    except OSError:
+        # Peak rather than current RSS where /proc isn't available
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def cpu_seconds():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def log_payload(x, prediction, model_version, rate=PAYLOAD_LOG_SAMPLE_RATE):
+    # Off by default: payloads are only logged for a random sample of calls
+    if rate > 0 and random.random() < rate:
+        if hasattr(x, 'to_pydict'):
+            x = x.to_pydict()
+        payload_logger.warning(f'model_version={model_version} payload={x} prediction={list(prediction)}')
+
+
+class RequestTimer:
+    # ASGI middleware observing http_request_duration_seconds. Unmatched
+    # paths are grouped under "other" to keep the label set bounded.
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            path = scope['path'] if status != 404 else 'other'
+            metrics.request_seconds.observe(time.perf_counter() - start, scope['method'], path, str(status))
+
+
+metrics = Metrics()
+metrics.gauge('process_resident_memory_bytes', 'Resident memory size in bytes', resident_memory_bytes)
+metrics.gauge('process_cpu_seconds_total', 'User and system CPU time in seconds', cpu_seconds, kind='counter')
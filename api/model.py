@@ -1,100 +1,304 @@
 import os
+import time
 import logging
+import numpy as np
 import pandas as pd
 from sklearn.preprocessing import StandardScaler, OneHotEncoder
 from sklearn.pipeline import Pipeline
 from sklearn.compose import ColumnTransformer
+from sklearn.model_selection import train_test_split
 from xgboost import XGBRegressor
 import mlflow
+from fast import CompiledModel, compile_pipeline
+from artifact_cache import artifact_cache
+from metrics import metrics
+from common.schema import (
+    PRICING_CATEGORICAL, PRICING_NUMERIC, PRICING_BOOL, PRICING_FEATURES, PRICING_TARGET, read_pricing_csv
+)
 
 
 mlflow.set_tracking_uri(os.environ['APP_URI'])
 
+MODEL_NAME = 'pricing_model'
+OHE_COLUMNS = PRICING_CATEGORICAL
+SCALE_COLUMNS = PRICING_NUMERIC
+BOOL_COLUMNS = PRICING_BOOL
+FEATURES = PRICING_FEATURES
+XGB_PARAMS = dict(
+    learning_rate=0.1,
+    max_depth=5,
+    max_leaves=31,
+    n_estimators=200,
+    num_parallel_tree=10,
+    subsample=0.8,
+    objective='reg:squarederror',
+)
+# The fast tier: one tree per round, fitted on the accurate model's
+# predictions. Those targets are noise-free, so no row subsampling. Its size
+# follows the teacher's: FAST_TREE_FRACTION of its trees, at most
+# n_estimators (100 against the 2,000 of XGB_PARAMS).
+FAST_MODEL_NAME = f'{MODEL_NAME}_fast'
+FAST_PARAMS = dict(
+    n_estimators=100,
+    max_depth=6,
+    num_parallel_tree=1,
+    subsample=1.0,
+)
+FAST_TREE_FRACTION = 0.2
+# ...and it is only served when it costs at most this share of the teacher's
+# batch time per row: below that, the fixed cost of a prediction dominates
+# and fewer trees mostly lose accuracy.
+FAST_MAX_COST_RATIO = 0.5
+TIER_MODEL_NAMES = {'accurate': MODEL_NAME, 'fast': FAST_MODEL_NAME}
+HOLDOUT_SIZE = 0.2
+
+
+def get_latest_version(model_name=MODEL_NAME):
+    client = mlflow.tracking.MlflowClient()
+    with metrics.time_load('registry_lookup'):
+        try:
+            model_versions = client.get_latest_versions(model_name)
+        except mlflow.exceptions.MlflowException as e:
+            if e.error_code == 'RESOURCE_DOES_NOT_EXIST':
+                return None
+            raise
+    if not model_versions:
+        return None
+    return str(max(model_versions, key=lambda v: int(v.version)).version)
+
+
 class Model:
-    def __init__(self):
-        self.model_name = 'pricing_model'
-        if self._is_model_in_production():
+    def __init__(self, model_version=None, model_name=MODEL_NAME):
+        self.model_name = model_name
+        self.model_version = model_version
+        self.feature_ranges = None
+        if self.model_version is not None or self._is_model_in_production():
             logging.warning('... Loading model from MLflow ...')
             self.model = self._load_model_from_mlflow()
+        elif self.model_name != MODEL_NAME:
+            # Only the accurate tier trains on startup, registering both
+            raise LookupError(f'No registered version of {self.model_name}')
         else:
             logging.warning('... Initializing and training a new model ...')
-            self.model = self._initialize_model()
-            self._train()
+            with metrics.time_load('train'):
+                self.model = self._train()
+        with metrics.time_load('compile'):
+            self.compiled = compile_pipeline(self.model)
     
     def __call__(self, x):
-        return self.model.predict(x)
+        if self.compiled is not None:
+            prediction = self.compiled(x)
+        else:
+            with metrics.time('dataframe'):
+                df = pd.DataFrame(x)
+            with metrics.time('preprocess'):
+                X = self.model[:-1].transform(df)
+            with metrics.time('predict'):
+                prediction = self.model[-1].predict(X)
+        metrics.batch_rows.observe(len(prediction))
+        return prediction
+
+    def warm_up(self, n_rows=64):
+        with metrics.time_load('warm_up'):
+            self(self.synthetic_batch(n_rows))
+
+    def synthetic_batch(self, n_rows):
+        # Rows cycling through the fitted one-hot vocabulary, so every
+        # encoder branch and a spread of tree paths get exercised.
+        preprocessing = self.model.named_steps['preprocessing']
+        ohe = preprocessing.named_transformers_['ohe'].named_steps['ohe']
+        scaler = preprocessing.named_transformers_['standard'].named_steps['scaler']
+        rows = np.arange(n_rows)
+        x = {}
+        for col, categories in zip(OHE_COLUMNS, ohe.categories_):
+            x[col] = categories[rows % len(categories)]
+        for col, mean, scale in zip(SCALE_COLUMNS, scaler.mean_, scaler.scale_):
+            x[col] = (mean + scale * np.linspace(-2, 2, n_rows)).clip(0).astype(int)
+        for i, col in enumerate(BOOL_COLUMNS):
+            x[col] = (rows >> i) % 2 == 1
+        return pd.DataFrame(x)[FEATURES]
+
+    def metadata(self):
+        # Vocabulary and numeric ranges this version was fitted on, for
+        # clients building their input forms. Versions registered before
+        # the ranges were logged only report the scaler statistics.
+        preprocessing = self.model.named_steps['preprocessing']
+        ohe = preprocessing.named_transformers_['ohe'].named_steps['ohe']
+        scaler = preprocessing.named_transformers_['standard'].named_steps['scaler']
+        ranges = self.feature_ranges or {}
+        return {
+            'model_name': self.model_name,
+            'model_version': self.model_version,
+            'categorical': {
+                col: np.asarray(categories).astype(str).tolist()
+                for col, categories in zip(OHE_COLUMNS, ohe.categories_)
+            },
+            'numeric': {
+                col: {'mean': float(mean), 'std': float(scale), **ranges.get(col, {})}
+                for col, mean, scale in zip(SCALE_COLUMNS, scaler.mean_, scaler.scale_)
+            },
+            'boolean': BOOL_COLUMNS,
+        }
 
     def _is_model_in_production(self):
         try:
-            client = mlflow.tracking.MlflowClient()
-            model_versions = client.get_latest_versions(self.model_name)
-            self.model_version = model_versions[0].version
-            return len(model_versions) > 0
+            self.model_version = get_latest_version(self.model_name)
+            return self.model_version is not None
         except Exception as e:
             logging.error(f"Error checking model in production: {e}")
             return False
 
     def _load_model_from_mlflow(self):
         try:
-            model_uri = f"models:/{self.model_name}/{self.model_version}"
-            model = mlflow.sklearn.load_model(model_uri)
+            with metrics.time_load('fetch'):
+                model_path = artifact_cache.fetch(self.model_name, self.model_version)
+            with metrics.time_load('load'):
+                model = mlflow.sklearn.load_model(model_path)
+                metadata = mlflow.models.Model.load(model_path).metadata or {}
+            self.feature_ranges = metadata.get('feature_ranges')
             return model
         except Exception as e:
             logging.error(f"Error loading model from MLflow: {e}")
             raise
 
     def _train(self):
-        data = pd.read_csv('get_around_pricing_project.csv', index_col=0)
-        X = data.drop('rental_price_per_day', axis=1)
-        y = data['rental_price_per_day']
-        with mlflow.start_run() as run:
-
-            self.model.fit(X,y)
-            logging.info("################## fitted ################")
-            mlflow.log_params(self.model.named_steps['model'].get_params())
-            mlflow.log_artifact
-            mlflow.sklearn.log_model(
-                sk_model=self.model,
-                artifact_path='sklearn-model',
-                registered_model_name=self.model_name,
-            )
-
-
-    def _initialize_model(self):
-        ohe_columns = ['model_key', 'fuel', 'paint_color', 'car_type']
-        scale_columns = ['mileage', 'engine_power']
-
-        ohe_pipe = Pipeline(
-            steps=[
-                ('ohe', OneHotEncoder(handle_unknown='ignore'))
-            ]
-        )
-        scaler_pipe = Pipeline(
-            steps=[
-                ('scaler', StandardScaler())
-            ]
-        )
-        preprocessing = ColumnTransformer(
-            transformers=[
-                ('ohe', ohe_pipe, ohe_columns),
-                ('standard', scaler_pipe, scale_columns)
-            ],
-            remainder='passthrough'
-        )
-        ml_pipe = Pipeline(
-            steps=[
-                ('preprocessing', preprocessing),
-                ('model', XGBRegressor(learning_rate=0.1,
-                                       max_depth=5,
-                                       max_leaves=31,
-                                       n_estimators=200,
-                                       num_parallel_tree=10,
-                                       subsample=0.8,
-                                       objective='reg:squarederror'))
-            ]
-        )
-        logging.info('################### model initialized ################"')
-        return ml_pipe
+        data = read_pricing_csv('get_around_pricing_project.csv')
+        X = data.drop(PRICING_TARGET, axis=1)
+        y = data[PRICING_TARGET]
+        pipelines, scores = train_tiers(X, y)
+        logging.info("################## fitted ################")
+        self.feature_ranges = register_tiers(pipelines, scores, X)
+        self._is_model_in_production()
+        return pipelines['accurate']
+
+
+def build_pipeline(**params):
+    # XGB_PARAMS, overridden by params (e.g. the winner of train.py's search)
+    ohe_columns = OHE_COLUMNS
+    scale_columns = SCALE_COLUMNS
+
+    ohe_pipe = Pipeline(
+        steps=[
+            ('ohe', OneHotEncoder(handle_unknown='ignore'))
+        ]
+    )
+    scaler_pipe = Pipeline(
+        steps=[
+            ('scaler', StandardScaler())
+        ]
+    )
+    preprocessing = ColumnTransformer(
+        transformers=[
+            ('ohe', ohe_pipe, ohe_columns),
+            ('standard', scaler_pipe, scale_columns)
+        ],
+        remainder='passthrough'
+    )
+    ml_pipe = Pipeline(
+        steps=[
+            ('preprocessing', preprocessing),
+            ('model', XGBRegressor(**{**XGB_PARAMS, **params}))
+        ]
+    )
+    return ml_pipe
+
+
+def feature_ranges(X):
+    return {
+        col: {'min': int(X[col].min()), 'max': int(X[col].max())}
+        for col in SCALE_COLUMNS
+    }
+
+
+def tree_count(pipeline):
+    model = pipeline.named_steps['model']
+    return model.get_booster().num_boosted_rounds() * (model.num_parallel_tree or 1)
+
+
+def distill(teacher, X, **params):
+    # FAST_PARAMS fitted on the teacher's predictions for X, with a fraction
+    # of the teacher's trees
+    n_estimators = max(1, min(FAST_PARAMS['n_estimators'], int(tree_count(teacher) * FAST_TREE_FRACTION)))
+    student = build_pipeline(**{**FAST_PARAMS, 'n_estimators': n_estimators, **params})
+    student.fit(X, teacher.predict(X))
+    return student
+
+
+def evaluate(pipeline, X, y, repeat=200):
+    # RMSE and latency of the compiled path the API serves: median time
+    # for one car, and per row when X is scored as a single batch.
+    compiled = CompiledModel.from_pipeline(pipeline)
+    x = {col: X[col].to_numpy() for col in FEATURES}
+    one = {col: values[:1] for col, values in x.items()}
+    prediction = compiled.predict(compiled.transform(x))
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        compiled.predict(compiled.transform(one))
+        times.append(time.perf_counter() - start)
+    batch_times = []
+    for _ in range(5):
+        start = time.perf_counter()
+        compiled.predict(compiled.transform(x))
+        batch_times.append(time.perf_counter() - start)
+    return {
+        'rmse': float(np.sqrt(np.mean((prediction - np.asarray(y)) ** 2))),
+        'latency_ms': float(np.median(times) * 1000),
+        'batch_us_per_row': float(np.median(batch_times) / len(X) * 1e6),
+        'trees': int(tree_count(pipeline)),
+    }
+
+
+def train_tiers(X, y, **params):
+    # Both tiers are scored on a holdout split first, then refitted on
+    # every row for registration. A student that isn't clearly cheaper than
+    # its teacher (a small tuned model) isn't worth serving: the fast tier
+    # is then the accurate model itself.
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=HOLDOUT_SIZE, random_state=0)
+    accurate = build_pipeline(**params).fit(X_train, y_train)
+    fast = distill(accurate, X_train)
+    scores = {'accurate': evaluate(accurate, X_test, y_test), 'fast': evaluate(fast, X_test, y_test)}
+    distilled = scores['fast']['batch_us_per_row'] <= FAST_MAX_COST_RATIO * scores['accurate']['batch_us_per_row']
+    accurate = build_pipeline(**params).fit(X, y)
+    if not distilled:
+        logging.warning(f"... Distilled model not cheap enough against its teacher ({scores['fast']}), "
+                        f"the fast tier serves the accurate model ...")
+        scores['fast'] = scores['accurate']
+        return {'accurate': accurate, 'fast': accurate}, scores
+    return {'accurate': accurate, 'fast': distill(accurate, X)}, scores
+
+
+def register_tiers(pipelines, scores, X):
+    # One run and one registered model per tier, holdout scores as run
+    # metrics and as tags of the registered version.
+    client = mlflow.tracking.MlflowClient()
+    for tier, pipeline in pipelines.items():
+        with mlflow.start_run(run_name=tier, nested=True):
+            mlflow.log_metrics({f'holdout_{k}': v for k, v in scores[tier].items()})
+            ranges = log_model(pipeline, X, TIER_MODEL_NAMES[tier])
+            version = get_latest_version(TIER_MODEL_NAMES[tier])
+            for key, value in scores[tier].items():
+                client.set_model_version_tag(TIER_MODEL_NAMES[tier], version, key, f'{value:.4g}')
+            if tier != 'accurate':
+                distilled = pipeline is not pipelines['accurate']
+                client.set_model_version_tag(TIER_MODEL_NAMES[tier], version, 'distilled', str(distilled).lower())
+        logging.warning(f'... Registered {tier} tier: {scores[tier]} ...')
+    return ranges
+
+
+def log_model(pipeline, X, model_name=MODEL_NAME):
+    # Logs a fitted pipeline to the active run and registers it as a new
+    # version, with the training ranges served by /metadata.
+    ranges = feature_ranges(X)
+    mlflow.log_params(pipeline.named_steps['model'].get_params())
+    mlflow.sklearn.log_model(
+        sk_model=pipeline,
+        artifact_path='sklearn-model',
+        registered_model_name=model_name,
+        metadata={'feature_ranges': ranges},
+    )
+    return ranges
+
 
 if __name__ == '__main__':
     model = Model()
@@ -1,9 +1,17 @@
 description = """
 # Prediction API
 This API allows users to input various features of cars and obtain predictions based on those features.
-    It includes two main endpoints:
+    It includes the following endpoints:
     - **Root Endpoint (`/`)**: A simple endpoint to check if the API is running.
+    - **Health Endpoint (`/health`)**: Liveness check, reports the model version currently loaded for each tier.
+    - **Ready Endpoint (`/ready`)**: Returns 503 until the model has been loaded at startup.
     - **Predict Endpoint (`/predict`)**: This endpoint accepts a POST request with car features and returns a prediction.
+    - **Bulk Predict Endpoint (`/predict/bulk`)**: Scores a whole CSV or NDJSON file and streams the predictions back.
+    - **Metadata Endpoint (`/metadata`)**: Categories and numeric ranges the serving model was fitted on.
+    - **Metrics Endpoint (`/metrics`)**: Latency histograms and process gauges in the Prometheus text format.
+    - **Batching Stats Endpoint (`/stats/batching`)**: Histograms of the micro-batches sent to each tier's model.
+    - **Executor Stats Endpoint (`/stats/executor`)**: Pending, rejected and timed out predictions.
+    - **Cache Stats Endpoint (`/stats/cache`)**: Hits, misses and evictions of each tier's prediction cache.
 ### Car Features
 The prediction endpoint accepts the following car features:
 - **model_key**: List of model keys as strings.
@@ -45,7 +53,108 @@ To make a prediction, send a POST request to `/predict` with a JSON payload cont
 **Example Response:**
 ```json
 {
-    "prediction": [151.57, 159.92]
+    "prediction": [151.57, 159.92],
+    "model_version": "3"
 }
 ```
+
+The model version that served the request is also returned in the `X-Model-Version` header.
+A background task polls the MLflow registry every `MODEL_POLL_INTERVAL` seconds (default 60, 0 only checks once at startup)
+and swaps a newly registered version in once it has been loaded and warmed up, without restarting the API.
+When the API serves an exported artifact (`SERVING_ARTIFACT`), the version is pinned and the registry isn't polled.
+
+### Tiers
+`/predict` and `/predict/bulk` take a `tier` query parameter choosing between two registered models:
+- `accurate` (default): `pricing_model`, 2,000 trees.
+- `fast`: `pricing_model_fast`, at most 100 trees distilled from the accurate model, about 10 times cheaper per row than the
+  default model. When distillation doesn't at least halve the cost (a small tuned model), it is the accurate model.
+  Meant for interactive requests and large batches where the last cents don't matter.
+
+The tier that answered is returned in the `X-Model-Tier` header. Until a fast model is registered (or exported,
+`SERVING_ARTIFACT_FAST`), `fast` requests are served by the accurate model. Each registered version carries its
+holdout `rmse`, `latency_ms` (one car) and `batch_us_per_row` as tags.
+
+```bash
+curl -X POST -H "Content-Type: application/json" --data @cars.json "$API_URL/predict?tier=fast"
+```
+
+### Metadata
+`/metadata` returns the fitted one-hot vocabulary of each categorical feature, the mean, standard deviation and
+training range of `mileage` and `engine_power`, and the boolean features, for the serving model version:
+
+```json
+{"model_name": "pricing_model", "model_version": "3",
+ "categorical": {"fuel": ["diesel", "electro", "hybrid_petrol", "petrol"], ...},
+ "numeric": {"mileage": {"mean": 200023.6, "std": 115858.1, "min": 7, "max": 399851}, ...},
+ "boolean": ["private_parking_available", ...]}
+```
+Responses carry an `ETag` that changes with the model version and `Cache-Control: max-age=METADATA_MAX_AGE`
+(seconds, default 60). Revalidate with `If-None-Match` to get a `304` while the version is unchanged.
+
+### Metrics
+`/metrics` exposes, per worker process, in the Prometheus text format:
+- `http_request_duration_seconds{method,path,status}`: latency of every request, until its last byte is sent.
+- `prediction_stage_seconds{stage}`: time spent in `decode` (JSON validation or Arrow/CSV parsing), `columns`
+  (Arrow columns to model inputs), `cache_lookup`, `dataframe` (only when the compiled path is unavailable),
+  `preprocess` (encoding and scaling), `predict` (booster) and `serialize` (response body).
+- `prediction_batch_rows`: rows per model call, after micro-batching and the prediction cache.
+- `model_load_seconds{step}`: `registry_lookup`, `fetch` (artifact cache or download), `load`, `train`, `compile`
+  and `warm_up`.
+- Gauges and counters: model version served, pending/rejected/timed out predictions, cache entries and lookups,
+  resident memory and CPU time.
+
+Payloads are never logged by default. Set `PAYLOAD_LOG_SAMPLE_RATE` (0 to 1) to log that fraction of `/predict`
+payloads and predictions on the `payload` logger.
+
+### Micro-batching
+Concurrent `/predict` requests are queued and coalesced into a single model call. A batch is sent to the model
+once it holds `BATCH_MAX_SIZE` cars (default 256) or `BATCH_MAX_WAIT_MS` milliseconds (default 2) have passed
+since its first request arrived, whichever comes first. Each caller only receives the predictions for its own cars.
+
+### Admission control
+Batches are predicted on a pool of `INFERENCE_WORKERS` threads (default 2), so the API keeps answering other
+requests while a large batch is being scored. At most `MAX_PENDING_REQUESTS` predictions (default 64) can be
+queued or running: beyond that `/predict` answers `429` right away. A prediction that takes longer than
+`REQUEST_TIMEOUT_MS` (default 5000) answers `503`. Both carry a `Retry-After` header (`RETRY_AFTER` seconds, default 1).
+
+### Prediction cache
+JSON predictions are cached per car, keyed by a digest of its 13 features and the serving model version. Within
+a batch only the cars missing from the cache are sent to the model. The cache is bounded to `CACHE_MAX_MB`
+megabytes (default 32, 0 disables it), entries expire after `CACHE_TTL_S` seconds (default 3600) and the whole
+cache is dropped when a new model version is swapped in. Setting `CACHE_MILEAGE_BUCKET` (e.g. 1000) shares
+entries between cars whose mileage falls in the same bucket, trading a little precision for a higher hit ratio.
+
+### Arrow IPC payloads
+Besides JSON, `/predict` accepts the same thirteen features as an Arrow IPC stream
+(`Content-Type: application/vnd.apache.arrow.stream`, one column per feature, string columns may be dictionary encoded).
+Columns are validated as whole typed arrays and fed to the model without building a Python object per car.
+Send `Accept: application/vnd.apache.arrow.stream` to get the predictions back as an Arrow stream with a single
+`prediction` column (float32); the model version is in the schema metadata and in `X-Model-Version`.
+
+```python
+import pyarrow as pa, requests
+sink = pa.BufferOutputStream()
+with pa.ipc.new_stream(sink, table.schema) as writer:
+    writer.write_table(table)
+response = requests.post(api_url + 'predict', data=sink.getvalue().to_pybytes(), headers={
+    'Content-Type': 'application/vnd.apache.arrow.stream',
+    'Accept': 'application/vnd.apache.arrow.stream',
+})
+predictions = pa.ipc.open_stream(response.content).read_all()['prediction']
+```
+
+### Bulk scoring
+POST a file to `/predict/bulk` with `Content-Type: text/csv` (same columns as `get_around_pricing_project.csv`)
+or `Content-Type: application/x-ndjson` (one JSON object with the car features per line). The file is scored
+`BULK_CHUNK_SIZE` rows at a time (default 10000) and predictions are streamed back as they are computed:
+- CSV: an `id,prediction,error` header, one line per car, then a final `# rows=...,errors=...,rows_per_second=...` line.
+- NDJSON: one `{"id": ..., "prediction": ...}` object per car, then a final `{"summary": {...}}` object.
+
+Rows are validated one by one: a row with a missing or malformed feature (an empty number, a boolean other than
+`true/false/1/0/yes/no`) gets its error instead of a prediction, `id,,"mileage: ..."` in CSV or
+`{"id": ..., "error": "..."}` in NDJSON, and the rest of the file is still scored.
+
+```bash
+curl -X POST --data-binary @fleet.csv -H "Content-Type: text/csv" $API_URL/predict/bulk
+```
 """
@@ -0,0 +1,147 @@
+import os
+import re
+import json
+from typing import List
+from pydantic import BaseModel, ValidationError, model_validator
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse, Response
+from metrics import metrics
+
+
+# JSON bodies above this size are decoded, and responses above this many
+# predictions encoded, in chunks of CHUNK_ROWS cars on the executor. Pydantic
+# validation and JSON encoding hold the GIL for the whole of a call: run as
+# one call, even on a thread, they would stall the event loop (about 1 µs
+# per car each way); between two chunks the loop gets the GIL back.
+OFFLOAD_BODY_BYTES = int(os.environ.get('OFFLOAD_BODY_BYTES', 65536))
+OFFLOAD_ROWS = int(os.environ.get('OFFLOAD_ROWS', 256))
+CHUNK_ROWS = int(os.environ.get('CHUNK_ROWS', 8192))
+
+_decoder = json.JSONDecoder()
+_whitespace = re.compile(r'[ \t\n\r]*')
+
+
+class CarModel(BaseModel):
+    model_key: List[str]
+    mileage: List[int]
+    engine_power: List[int]
+    fuel: List[str]
+    paint_color: List[str]
+    car_type: List[str]
+    private_parking_available: List[bool]
+    has_gps: List[bool]
+    has_air_conditioning: List[bool]
+    automatic_car: List[bool]
+    has_getaround_connect: List[bool]
+    has_speed_regulator: List[bool]
+    winter_tires: List[bool]
+
+    @model_validator(mode='after')
+    def same_length(self):
+        # One value per car in every column: the batcher concatenates the
+        # columns of several requests and slices the predictions back by
+        # row count.
+        lengths = {col: len(values) for col, values in self}
+        if len(set(lengths.values())) > 1:
+            raise ValueError(f'Every feature needs one value per car, got lengths {lengths}')
+        return self
+
+
+FEATURES = list(CarModel.model_fields)
+
+
+def _validation_error(e, offset=0):
+    # Locations relative to the whole body, whatever chunk failed
+    errors = []
+    for error in e.errors():
+        loc = error['loc']
+        if offset and len(loc) > 1 and isinstance(loc[1], int):
+            loc = (loc[0], loc[1] + offset, *loc[2:])
+        errors.append({**error, 'loc': ('body', *loc)})
+    return RequestValidationError(errors)
+
+
+def decode_json(body):
+    try:
+        with metrics.time('decode'):
+            car_model = CarModel.model_validate_json(body)
+    except ValidationError as e:
+        raise _validation_error(e)
+    return {col: getattr(car_model, col) for col in FEATURES}
+
+
+def _members(text):
+    # The top-level object, parsed one value (one column) at a time
+    members = {}
+    i = _whitespace.match(text).end()
+    if text[i:i + 1] != '{':
+        raise ValueError('expected an object')
+    i = _whitespace.match(text, i + 1).end()
+    while text[i:i + 1] != '}':
+        key, i = _decoder.raw_decode(text, i)
+        i = _whitespace.match(text, i).end()
+        if not isinstance(key, str) or text[i:i + 1] != ':':
+            raise ValueError('expected a key')
+        members[key], i = _decoder.raw_decode(text, _whitespace.match(text, i + 1).end())
+        i = _whitespace.match(text, i).end()
+        if text[i:i + 1] == ',':
+            i = _whitespace.match(text, i + 1).end()
+        elif text[i:i + 1] != '}':
+            raise ValueError('expected , or }')
+    if text[_whitespace.match(text, i + 1).end():]:
+        raise ValueError('extra data')
+    return members
+
+
+def _columns(body):
+    # The 13 feature lists, or None for anything but 13 lists of the same
+    # length (malformed JSON, a missing feature, ragged lists)
+    try:
+        members = _members(body.decode())
+    except ValueError:
+        return None
+    columns = [members.get(col) for col in FEATURES]
+    if not all(isinstance(values, list) for values in columns) or len({len(values) for values in columns}) != 1:
+        return None
+    return columns
+
+
+def decode_json_chunked(body):
+    # Same result and errors as decode_json, validated CHUNK_ROWS cars at a
+    # time. Invalid bodies go through decode_json, for its error messages.
+    with metrics.time('decode'):
+        columns = _columns(body)
+        if columns is not None:
+            x = {col: [] for col in FEATURES}
+            for start in range(0, len(columns[0]), CHUNK_ROWS):
+                chunk = {col: values[start:start + CHUNK_ROWS] for col, values in zip(FEATURES, columns)}
+                try:
+                    car_model = CarModel.model_validate(chunk)
+                except ValidationError as e:
+                    raise _validation_error(e, start)
+                for col in FEATURES:
+                    x[col].extend(getattr(car_model, col))
+    if columns is None:
+        return decode_json(body)
+    return x
+
+
+def json_response(prediction, model_version, headers):
+    with metrics.time('serialize'):
+        return JSONResponse(
+            {'prediction': prediction.tolist(), 'model_version': model_version},
+            headers=headers
+        )
+
+
+def json_response_chunked(prediction, model_version, headers):
+    # The body JSONResponse would render, encoded CHUNK_ROWS predictions at a
+    # time
+    with metrics.time('serialize'):
+        parts = [
+            json.dumps(prediction[start:start + CHUNK_ROWS].tolist(), allow_nan=False, separators=(',', ':'))[1:-1]
+            for start in range(0, len(prediction), CHUNK_ROWS)
+        ]
+        version = json.dumps(model_version, ensure_ascii=False)
+        body = f'{{"prediction":[{",".join(parts)}],"model_version":{version}}}'.encode()
+        return Response(body, media_type='application/json', headers=headers)
@@ -0,0 +1,176 @@
+import os
+import json
+import ctypes
+import argparse
+import importlib.util
+import numpy as np
+from fast import CompiledModel
+from metrics import metrics
+
+
+# Self-contained serving artifact: the booster in XGBoost's native binary
+# format, the fitted encoder/scaler parameters and the /metadata body.
+# Loading one only needs numpy and libxgboost, no mlflow, sklearn, pandas
+# nor the xgboost Python package (whose import pulls sklearn and pandas in).
+#
+#   python serving.py --output serving_model          # latest registered version
+#   python serving.py --tier fast --output serving_model_fast
+#   SERVING_ARTIFACT=serving_model SERVING_ARTIFACT_FAST=serving_model_fast gunicorn api:app
+
+BOOSTER_FILE = 'booster.ubj'
+SPEC_FILE = 'serving.json'
+
+_lib = None
+
+
+def _find_library():
+    # libxgboost ships inside the xgboost wheel: locate it without running
+    # the package's __init__.
+    spec = importlib.util.find_spec('xgboost')
+    if spec is None or not spec.submodule_search_locations:
+        return None
+    for directory in spec.submodule_search_locations:
+        for name in ('libxgboost.so', 'libxgboost.dylib', 'xgboost.dll'):
+            path = os.path.join(directory, 'lib', name)
+            if os.path.exists(path):
+                return path
+    return None
+
+
+def _library():
+    global _lib
+    if _lib is None:
+        path = _find_library()
+        if path is None:
+            return None
+        lib = ctypes.cdll.LoadLibrary(path)
+        lib.XGBGetLastError.restype = ctypes.c_char_p
+        _lib = lib
+    return _lib
+
+
+class NativeBooster:
+    # The part of xgboost.Booster that CompiledModel uses, over XGBoost's C
+    # API: the same library and predictor as Booster.inplace_predict.
+
+    def __init__(self, lib, path):
+        self._lib = lib
+        self.handle = ctypes.c_void_p()
+        self._check(lib.XGBoosterCreate(None, ctypes.c_uint64(0), ctypes.byref(self.handle)))
+        self._check(lib.XGBoosterLoadModel(self.handle, os.fsencode(path)))
+
+    def _check(self, ret):
+        if ret != 0:
+            raise RuntimeError(self._lib.XGBGetLastError().decode())
+
+    def inplace_predict(self, X, iteration_range=(0, 0), missing=np.nan, validate_features=False):
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        interface = X.__array_interface__
+        config = {
+            'type': 0,
+            'training': False,
+            'iteration_begin': int(iteration_range[0]),
+            'iteration_end': int(iteration_range[1]),
+            'missing': float(missing),
+            'strict_shape': False,
+            'cache_id': 0,
+        }
+        shape = ctypes.POINTER(ctypes.c_uint64)()
+        dims = ctypes.c_uint64()
+        result = ctypes.POINTER(ctypes.c_float)()
+        self._check(self._lib.XGBoosterPredictFromDense(
+            self.handle, json.dumps(interface).encode(), json.dumps(config).encode(), None,
+            ctypes.byref(shape), ctypes.byref(dims), ctypes.byref(result)
+        ))
+        n = int(np.prod([shape[i] for i in range(dims.value)]))
+        # The buffer belongs to the booster and is reused by the next call
+        return np.ctypeslib.as_array(result, shape=(n,)).copy()
+
+    def __del__(self):
+        if self.handle:
+            self._lib.XGBoosterFree(self.handle)
+            self.handle = ctypes.c_void_p()
+
+
+def load_booster(path):
+    lib = _library()
+    if lib is not None:
+        return NativeBooster(lib, path)
+    # A libxgboost installed outside the package: let xgboost find it
+    import xgboost
+    return xgboost.Booster(model_file=path)
+
+
+class ServingModel:
+    # Serves an exported artifact with the interface of model.Model that
+    # the API relies on: __call__, warm_up, metadata, compiled and the
+    # model name and version.
+
+    def __init__(self, path):
+        with metrics.time_load('load'):
+            with open(os.path.join(path, SPEC_FILE)) as f:
+                spec = json.load(f)
+            self.model_name = spec['model_name']
+            self.model_version = spec['model_version']
+            self._metadata = spec['metadata']
+            self.compiled = CompiledModel(spec['encoding'], load_booster(os.path.join(path, BOOSTER_FILE)))
+
+    def __call__(self, x):
+        prediction = self.compiled(x)
+        metrics.batch_rows.observe(len(prediction))
+        return prediction
+
+    def warm_up(self, n_rows=64):
+        with metrics.time_load('warm_up'):
+            self(self.synthetic_batch(n_rows))
+
+    def synthetic_batch(self, n_rows):
+        # Same rows as Model.synthetic_batch, as a dict of columns
+        rows = np.arange(n_rows)
+        x = {}
+        for col, categories, _ in self.compiled.ohe_columns:
+            x[col] = categories[rows % len(categories)]
+        for col, mean, scale, _ in self.compiled.scale_columns:
+            x[col] = (mean + scale * np.linspace(-2, 2, n_rows)).clip(0).astype(int)
+        for i, (col, _) in enumerate(self.compiled.passthrough_columns):
+            x[col] = (rows >> i) % 2 == 1
+        return x
+
+    def metadata(self):
+        return self._metadata
+
+
+def export(model, path):
+    # model: a model.Model whose pipeline compiled. The spec is written
+    # last, so a directory with a spec is always complete.
+    if model.compiled is None:
+        raise ValueError(f'{model.model_name} version {model.model_version} has no compiled form to export')
+    os.makedirs(path, exist_ok=True)
+    model.compiled.booster.save_model(os.path.join(path, BOOSTER_FILE))
+    spec = {
+        'model_name': model.model_name,
+        'model_version': model.model_version,
+        'encoding': model.compiled.spec,
+        'metadata': model.metadata(),
+    }
+    with open(os.path.join(path, SPEC_FILE), 'w') as f:
+        json.dump(spec, f)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Export a registered model as a self-contained serving artifact')
+    parser.add_argument('--tier', default='accurate', choices=['accurate', 'fast'])
+    parser.add_argument('--version', default=None, help='default: the latest registered version')
+    parser.add_argument('--output', default='serving_model')
+    args = parser.parse_args()
+
+    import pandas as pd
+    from model import Model, FEATURES, TIER_MODEL_NAMES
+
+    model = Model(args.version, TIER_MODEL_NAMES[args.tier])
+    export(model, args.output)
+    served = ServingModel(args.output)
+    x = served.synthetic_batch(1024)
+    max_diff = float(np.max(np.abs(served(x) - model.model.predict(pd.DataFrame(x)[FEATURES]))))
+    print(f'exported {model.model_name} version {model.model_version} to {args.output} '
+          f'(max abs diff with Pipeline.predict {max_diff:.2e})')
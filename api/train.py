@@ -0,0 +1,197 @@
+import os
+import json
+import time
+import hashlib
+import inspect
+import logging
+import argparse
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+from scipy import sparse
+from sklearn.model_selection import KFold
+from xgboost import XGBRegressor
+
+
+# Offline training: a cross-validated hyperparameter search over a process
+# pool, every trial logged to MLflow, only the winner registered (with the
+# fast tier distilled from it, see model.train_tiers).
+#
+#   APP_URI=file:///tmp/mlruns python train.py --trials 40 --jobs 8
+#
+# The module only imports what the trials need, model.py (and mlflow) are
+# loaded by the parent process alone.
+
+TRAIN_CACHE_DIR = os.environ.get('TRAIN_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'train_cache'))
+MAX_ROUNDS = 2000
+EARLY_STOPPING_ROUNDS = 50
+SEARCH_SPACE = {
+    'learning_rate': ('log', 0.01, 0.3),
+    'max_depth': ('choice', [3, 4, 5, 6, 8, 10]),
+    'max_leaves': ('choice', [0, 15, 31, 63]),
+    'min_child_weight': ('choice', [1, 2, 5, 10]),
+    'subsample': ('uniform', 0.5, 1.0),
+    'colsample_bytree': ('uniform', 0.4, 1.0),
+    'reg_lambda': ('log', 0.1, 10.0),
+}
+
+_data = None
+
+
+def sample_params(rng):
+    # XGB_PARAMS overridden, as build_pipeline does when the winner is
+    # refitted, so both train the same model. One tree per round, since the
+    # early-stopped round count only holds for the num_parallel_tree it was
+    # found with.
+    from model import XGB_PARAMS
+
+    params = {}
+    for name, (kind, *spec) in SEARCH_SPACE.items():
+        if kind == 'choice':
+            value = spec[0][rng.integers(len(spec[0]))]
+        elif kind == 'log':
+            value = float(np.exp(rng.uniform(np.log(spec[0]), np.log(spec[1]))))
+        else:
+            value = float(rng.uniform(spec[0], spec[1]))
+        params[name] = value.item() if isinstance(value, np.generic) else value
+    return {**XGB_PARAMS, **params, 'num_parallel_tree': 1, 'n_estimators': MAX_ROUNDS}
+
+
+def design_matrix(path, cache_dir=TRAIN_CACHE_DIR):
+    # The encoded matrix is computed once per (CSV, preprocessing code) and
+    # shared by every trial. The encoder and scaler are fitted on the whole
+    # file: the one-hot vocabulary carries no target information and trees
+    # are insensitive to the scaling, so folds don't need their own fit.
+    from model import build_pipeline
+    from common import schema
+
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        digest.update(f.read())
+    digest.update(inspect.getsource(build_pipeline).encode())
+    digest.update(inspect.getsource(schema).encode())
+    key = digest.hexdigest()[:16]
+    matrix_path = os.path.join(cache_dir, f'{key}.npz')
+    target_path = os.path.join(cache_dir, f'{key}.npy')
+    if os.path.exists(matrix_path) and os.path.exists(target_path):
+        logging.warning(f'... Using cached design matrix {matrix_path} ...')
+        return matrix_path, target_path
+
+    data = schema.read_pricing_csv(path)
+    X = data.drop(schema.PRICING_TARGET, axis=1)
+    y = data[schema.PRICING_TARGET].to_numpy(dtype=np.float32)
+    matrix = build_pipeline().named_steps['preprocessing'].fit_transform(X)
+    os.makedirs(cache_dir, exist_ok=True)
+    sparse.save_npz(matrix_path, sparse.csr_matrix(matrix, dtype=np.float32))
+    np.save(target_path, y)
+    return matrix_path, target_path
+
+
+def _load(matrix_path, target_path):
+    global _data
+    _data = (sparse.load_npz(matrix_path).tocsr(), np.load(target_path))
+
+
+def run_trial(trial, params, folds, seed):
+    X, y = _data
+    start = time.perf_counter()
+    scores, rounds = [], []
+    for train, valid in KFold(folds, shuffle=True, random_state=seed).split(X):
+        # One thread per trial: the parallelism is across trials
+        model = XGBRegressor(**params, n_jobs=1, eval_metric='rmse', early_stopping_rounds=EARLY_STOPPING_ROUNDS)
+        model.fit(X[train], y[train], eval_set=[(X[valid], y[valid])], verbose=False)
+        scores.append(model.best_score)
+        rounds.append(model.best_iteration + 1)
+    return {
+        'trial': trial,
+        'params': params,
+        'rmse': float(np.mean(scores)),
+        'rmse_std': float(np.std(scores)),
+        'best_n_estimators': int(np.mean(rounds)),
+        'seconds': time.perf_counter() - start,
+    }
+
+
+def search(matrix_path, target_path, trials, folds, jobs, seed, on_result):
+    # spawn rather than fork: libgomp, which XGBoost uses, is not fork-safe
+    context = multiprocessing.get_context('spawn')
+    results = []
+    with ProcessPoolExecutor(jobs, mp_context=context, initializer=_load,
+                             initargs=(matrix_path, target_path)) as pool:
+        futures = [pool.submit(run_trial, i, params, folds, seed) for i, params in enumerate(trials)]
+        for future in as_completed(futures):
+            result = future.result()
+            on_result(result)
+            results.append(result)
+    return sorted(results, key=lambda r: r['trial'])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Cross-validated hyperparameter search, registers the best model')
+    parser.add_argument('--data', default='get_around_pricing_project.csv')
+    parser.add_argument('--trials', type=int, default=20, help='trials, the current XGB_PARAMS included')
+    parser.add_argument('--folds', type=int, default=5)
+    parser.add_argument('--jobs', type=int, default=os.cpu_count(), help='trials run in parallel')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--experiment', default='pricing_model_search')
+    parser.add_argument('--no-register', action='store_true', help='search only, e.g. to time it')
+    args = parser.parse_args()
+
+    import mlflow
+    from model import TIER_MODEL_NAMES, XGB_PARAMS, train_tiers, register_tiers
+    from common.schema import PRICING_TARGET, read_pricing_csv
+
+    start = time.perf_counter()
+    matrix_path, target_path = design_matrix(args.data)
+    prepared = time.perf_counter()
+
+    rng = np.random.default_rng(args.seed)
+    # The current production parameters compete too, with early stopping
+    trials = [dict(XGB_PARAMS)] + [sample_params(rng) for _ in range(args.trials - 1)]
+
+    def log_trial(result):
+        with mlflow.start_run(run_name=f"trial-{result['trial']}", nested=True):
+            mlflow.log_params(result['params'])
+            mlflow.log_metrics({k: result[k] for k in ('rmse', 'rmse_std', 'best_n_estimators', 'seconds')})
+        logging.warning(f"... trial {result['trial']}: rmse {result['rmse']:.3f} in {result['seconds']:.1f}s ...")
+
+    mlflow.set_experiment(args.experiment)
+    with mlflow.start_run(run_name='hyperparameter-search'):
+        mlflow.log_params({'trials': args.trials, 'folds': args.folds, 'jobs': args.jobs,
+                           'cpus': os.cpu_count(), 'seed': args.seed})
+        results = search(matrix_path, target_path, trials, args.folds, args.jobs, args.seed, log_trial)
+        searched = time.perf_counter()
+        best = min(results, key=lambda r: r['rmse'])
+        trial_seconds = sum(r['seconds'] for r in results)
+        summary = {
+            'trials': len(results),
+            'folds': args.folds,
+            'jobs': args.jobs,
+            'cpus': os.cpu_count(),
+            'prepare_seconds': round(prepared - start, 3),
+            'search_seconds': round(searched - prepared, 3),
+            'trial_seconds': round(trial_seconds, 3),
+            # Average number of trials running at once; only a speedup when
+            # it doesn't exceed the cores, oversubscribed trials just slow down
+            'trials_in_flight': round(trial_seconds / (searched - prepared), 2),
+            'best_trial': best['trial'],
+            'best_rmse': round(best['rmse'], 4),
+            'baseline_rmse': round(results[0]['rmse'], 4),
+        }
+        mlflow.log_metrics({k: v for k, v in summary.items() if k.endswith(('seconds', 'flight', 'rmse'))})
+
+        if not args.no_register:
+            # Refit the winner on the whole file with the number of rounds
+            # early stopping picked, and register that model alone, with the
+            # fast tier distilled from it.
+            params = {**best['params'], 'n_estimators': best['best_n_estimators']}
+            data = read_pricing_csv(args.data)
+            X = data.drop(PRICING_TARGET, axis=1)
+            with mlflow.start_run(run_name='winner', nested=True):
+                mlflow.log_metrics({'cv_rmse': best['rmse'], 'cv_rmse_std': best['rmse_std']})
+                pipelines, scores = train_tiers(X, data[PRICING_TARGET], **params)
+                register_tiers(pipelines, scores, X)
+            summary['registered'] = list(TIER_MODEL_NAMES.values())
+            summary['tiers'] = scores
+    print(json.dumps(summary, indent=2))
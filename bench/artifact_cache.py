@@ -0,0 +1,55 @@
+import os
+import sys
+import json
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+API_DIR = os.path.join(ROOT_DIR, 'api')
+
+# Run in a fresh interpreter so every measurement pays the same imports.
+LOAD = '''
+import time, json
+start = time.perf_counter()
+from holder import holder
+imported = time.perf_counter()
+holder.load()
+loaded = time.perf_counter()
+print(json.dumps({"import_s": imported - start, "load_s": loaded - imported, "version": holder.model_version}))
+'''
+
+
+def load(cache_dir):
+    env = dict(os.environ, ARTIFACT_CACHE_DIR=cache_dir, PYTHONPATH=ROOT_DIR)
+    out = subprocess.run(
+        [sys.executable, '-c', LOAD], cwd=API_DIR, env=env,
+        capture_output=True, text=True, check=True
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Model load time with a cold and a warm artifact cache')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', default=None)
+    args = parser.parse_args()
+
+    results = {'cold': [], 'warm': []}
+    for _ in range(args.repeat):
+        cache_dir = tempfile.mkdtemp(prefix='model_cache_')
+        try:
+            results['cold'].append(load(cache_dir))
+            results['warm'].append(load(cache_dir))
+        finally:
+            shutil.rmtree(cache_dir)
+    summary = {
+        kind: {key: round(min(run[key] for run in runs), 3) for key in ('import_s', 'load_s')}
+        for kind, runs in results.items()
+    }
+    print(json.dumps(summary, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'summary': summary, 'runs': results}, f, indent=2)
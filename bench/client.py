@@ -0,0 +1,104 @@
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+import requests
+import pandas as pd
+
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+API_DIR = os.path.join(ROOT_DIR, 'api')
+sys.path.insert(0, ROOT_DIR)
+from common.client import PredictionClient  # noqa: E402
+from common.schema import PRICING_FEATURES  # noqa: E402
+
+
+def start_server(port, workers, timeout):
+    # Prediction cache disabled so repeated fleets keep hitting the model
+    env = dict(os.environ, PYTHONPATH=ROOT_DIR, CACHE_MAX_MB='0', MODEL_POLL_INTERVAL='0')
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'api:app', '--port', str(port),
+         '--workers', str(workers), '--log-level', 'warning'],
+        cwd=API_DIR, env=env
+    )
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if requests.get(f'http://localhost:{port}/ready', timeout=1).status_code == 200:
+                return server
+        except requests.ConnectionError:
+            pass
+        time.sleep(0.5)
+    server.kill()
+    raise RuntimeError('API did not become ready')
+
+
+def fleet(data, n_rows):
+    rows = data.sample(n_rows, replace=True, random_state=0)
+    return rows.to_dict('list')
+
+
+def naive(api_url, cars):
+    # What the front used to do: no session, no timeout, one body
+    response = requests.post(api_url + 'predict', json=cars)
+    response.raise_for_status()
+    return response.json()['prediction']
+
+
+def throughput(predict, cars, calls):
+    n_rows = len(next(iter(cars.values())))
+    start = time.perf_counter()
+    for _ in range(calls):
+        predict(cars)
+    elapsed = time.perf_counter() - start
+    return {'calls': calls, 'rows_per_call': n_rows, 'ms_per_call': round(1000 * elapsed / calls, 2),
+            'rows_per_second': round(calls * n_rows / elapsed)}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Prediction client throughput against a local uvicorn')
+    parser.add_argument('--data', default=os.path.join(API_DIR, 'get_around_pricing_project.csv'))
+    parser.add_argument('--port', type=int, default=8011)
+    parser.add_argument('--workers', type=int, default=1, help='uvicorn worker processes')
+    parser.add_argument('--fleet-sizes', type=int, nargs='+', default=[1, 1000, 20000])
+    parser.add_argument('--chunk-sizes', type=int, nargs='+', default=[500, 2000])
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4])
+    parser.add_argument('--rows-per-size', type=int, default=40000, help='rows sent per measurement')
+    parser.add_argument('--max-calls', type=int, default=200)
+    parser.add_argument('--timeout', type=float, default=300)
+    parser.add_argument('--output', default=None)
+    args = parser.parse_args()
+
+    data = pd.read_csv(args.data, index_col=0)[PRICING_FEATURES]
+    api_url = f'http://localhost:{args.port}/'
+    server = start_server(args.port, args.workers, args.timeout)
+    results = []
+    try:
+        for fleet_size in args.fleet_sizes:
+            cars = fleet(data, fleet_size)
+            calls = max(1, min(args.max_calls, args.rows_per_size // fleet_size))
+            naive(api_url, cars)
+            result = {'fleet_size': fleet_size, 'mode': 'requests.post', **throughput(lambda c: naive(api_url, c), cars, calls)}
+            print(json.dumps(result), flush=True)
+            results.append(result)
+            for chunk_size in args.chunk_sizes:
+                for concurrency in args.concurrency:
+                    if fleet_size <= chunk_size and (chunk_size, concurrency) != (args.chunk_sizes[0], args.concurrency[0]):
+                        continue
+                    with PredictionClient(api_url, chunk_size=chunk_size, concurrency=concurrency) as client:
+                        client.predict(cars)
+                        result = {
+                            'fleet_size': fleet_size, 'mode': 'PredictionClient',
+                            'chunk_size': chunk_size, 'concurrency': concurrency,
+                            **throughput(client.predict, cars, calls)
+                        }
+                    print(json.dumps(result), flush=True)
+                    results.append(result)
+    finally:
+        server.terminate()
+        server.wait()
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
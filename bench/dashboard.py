@@ -0,0 +1,59 @@
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+from streamlit.testing.v1 import AppTest
+
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+FRONT_DIR = os.path.join(ROOT_DIR, 'front')
+
+
+def render_times(app_path, page, reruns):
+    at = AppTest.from_file(app_path, default_timeout=600)
+    at.run()
+    at.sidebar.radio[0].set_value(page).run()
+    times = []
+    for _ in range(reruns):
+        start = time.perf_counter()
+        at.run()
+        times.append(time.perf_counter() - start)
+        if at.exception:
+            raise RuntimeError(at.exception[0].value)
+    return times
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Streamlit render time per interaction, per page')
+    parser.add_argument('--front-dir', default=FRONT_DIR, help='front/ checkout to measure')
+    parser.add_argument('--data-dir', default=FRONT_DIR, help='directory holding the data files')
+    parser.add_argument('--pages', nargs='+', default=['Analysis', 'Simulation', 'Price prediction'])
+    parser.add_argument('--api-url', default=os.environ.get('API_URL', 'http://localhost:8000/'),
+                        help='API the Price prediction page fetches its metadata from')
+    parser.add_argument('--reruns', type=int, default=20)
+    parser.add_argument('--output', default=None)
+    args = parser.parse_args()
+
+    app_path = os.path.abspath(os.path.join(args.front_dir, 'app.py'))
+    sys.path[:0] = [os.path.abspath(args.front_dir), os.path.abspath(ROOT_DIR)]
+    os.environ['API_URL'] = args.api_url
+    os.chdir(args.data_dir)
+    results = {}
+    for page in args.pages:
+        times = sorted(render_times(app_path, page, args.reruns))
+        results[page] = {
+            'reruns': len(times),
+            'mean_ms': round(1000 * sum(times) / len(times), 1),
+            'p50_ms': round(1000 * times[len(times) // 2], 1),
+            'max_ms': round(1000 * times[-1], 1),
+        }
+        print(page, json.dumps(results[page]))
+    # Peak RSS of this process after rendering every page: the footprint of
+    # one Streamlit session with its cached data.
+    results['peak_rss_mb'] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    print('peak_rss_mb', results['peak_rss_mb'])
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,123 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import numpy as np
+import pandas as pd
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.join(BENCH_DIR, '..')
+API_DIR = os.path.join(ROOT_DIR, 'api')
+FRONT_DIR = os.path.join(ROOT_DIR, 'front')
+# api/ first: bench/artifact_cache.py would shadow the API module
+sys.path[:0] = [API_DIR, FRONT_DIR, ROOT_DIR, BENCH_DIR]
+import report  # noqa: E402
+from preprocessing import scale_up  # noqa: E402
+
+
+def timed(fn, setup=None, repeat=20, max_seconds=5):
+    # Runs fn(setup()) up to `repeat` times, stopping early once max_seconds
+    # of measured time is spent. setup() is not measured.
+    times = []
+    while len(times) < repeat and sum(times) < max_seconds:
+        args = setup() if setup is not None else ()
+        start = time.perf_counter()
+        fn(*args)
+        times.append(time.perf_counter() - start)
+    times = np.asarray(times) * 1000
+    return {
+        'repeat': len(times),
+        'min_ms': round(float(times.min()), 3),
+        'median_ms': round(float(np.median(times)), 3),
+        'mean_ms': round(float(times.mean()), 3),
+    }
+
+
+def bench_model(pricing_data, batch_sizes, work_dir, repeat, max_seconds):
+    # Trained in-process against a file-based MLflow store in work_dir
+    shutil.copy(pricing_data, os.path.join(work_dir, 'get_around_pricing_project.csv'))
+    os.environ['APP_URI'] = 'file://' + os.path.join(work_dir, 'mlruns')
+    os.environ['ARTIFACT_CACHE_DIR'] = os.path.join(work_dir, 'model_cache')
+    cwd = os.getcwd()
+    os.chdir(work_dir)
+    try:
+        from model import Model, FEATURES
+        model = Model()
+    finally:
+        os.chdir(cwd)
+    data = pd.read_csv(pricing_data, index_col=0)[FEATURES]
+    rng = np.random.default_rng(0)
+    results = []
+    for batch_size in batch_sizes:
+        rows = data.iloc[rng.integers(0, len(data), batch_size)]
+        x = rows.to_dict('list')
+        results.append({'benchmark': 'Model.__call__', 'scale': batch_size, 'rows': batch_size,
+                        **timed(lambda: model(x), repeat=repeat, max_seconds=max_seconds)})
+        results.append({'benchmark': 'Pipeline.predict', 'scale': batch_size, 'rows': batch_size,
+                        **timed(lambda: model.model.predict(pd.DataFrame(x)), repeat=repeat, max_seconds=max_seconds)})
+    return results
+
+
+def bench_front(delay_data, factors, repeat, max_seconds):
+    import utils
+    from simulation import SimulationEngine
+
+    raw = pd.read_excel(delay_data)
+    results = []
+    cwd = os.getcwd()
+    os.chdir(os.path.dirname(os.path.abspath(delay_data)))
+    try:
+        results.append({'benchmark': 'preprocessed_df', 'scale': 1, 'rows': len(raw),
+                        **timed(utils.preprocessed_df, repeat=repeat, max_seconds=max_seconds)})
+    finally:
+        os.chdir(cwd)
+    for factor in factors:
+        scaled = scale_up(raw, factor)
+        # preprocess() writes its columns into the frame, so every run gets
+        # a fresh copy, made outside the measured time.
+        results.append({'benchmark': 'preprocess', 'scale': factor, 'rows': len(scaled),
+                        **timed(utils.preprocess, setup=lambda: (scaled.copy(),), repeat=repeat, max_seconds=max_seconds)})
+        df = utils.preprocess(scaled.copy())
+        df_timedelay = df[df['state'] == 'delayed']
+        df_consecutive = df[df['impact'] != '-']
+        results.append({'benchmark': 'get_outlier', 'scale': factor, 'rows': len(df_timedelay),
+                        **timed(lambda: utils.get_outlier(df_timedelay, 'delay_at_checkout_in_minutes'),
+                                repeat=repeat, max_seconds=max_seconds)})
+        for scope in ('All', 'connect'):
+            results.append({'benchmark': f'run_simulation[{scope}]', 'scale': factor, 'rows': len(df_consecutive),
+                            **timed(lambda: utils.run_simulation(df_consecutive, 60, scope),
+                                    repeat=repeat, max_seconds=max_seconds)})
+        engine = SimulationEngine(df_consecutive)
+        results.append({'benchmark': 'SimulationEngine.query[All]', 'scale': factor, 'rows': len(df_consecutive),
+                        **timed(lambda: engine.query(60, 'All'), repeat=repeat, max_seconds=max_seconds)})
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Micro-benchmarks of the API and dashboard hot paths, offline')
+    parser.add_argument('--pricing-data', default=os.path.join(API_DIR, 'get_around_pricing_project.csv'))
+    parser.add_argument('--delay-data', default=os.path.join(FRONT_DIR, 'get_around_delay_analysis.xlsx'))
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 64, 1024, 16384])
+    parser.add_argument('--factors', type=int, nargs='+', default=[1, 10, 100],
+                        help='scale-up factors of the delay analysis data')
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--max-seconds', type=float, default=5, help='measured time budget per benchmark')
+    parser.add_argument('--skip', nargs='*', default=[], choices=['model', 'front'])
+    parser.add_argument('--output', default=None)
+    args = parser.parse_args()
+
+    results = []
+    if 'model' not in args.skip:
+        work_dir = tempfile.mkdtemp(prefix='bench-hotpaths-')
+        try:
+            results += bench_model(args.pricing_data, args.batch_sizes, work_dir, args.repeat, args.max_seconds)
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    if 'front' not in args.skip:
+        results += bench_front(args.delay_data, args.factors, args.repeat, args.max_seconds)
+    for result in results:
+        print(json.dumps(result))
+    report.write(args.output, 'hotpaths', results)
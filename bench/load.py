@@ -0,0 +1,159 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+import subprocess
+import numpy as np
+import pandas as pd
+import requests
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.join(BENCH_DIR, '..')
+API_DIR = os.path.join(ROOT_DIR, 'api')
+sys.path[:0] = [BENCH_DIR, ROOT_DIR]
+import report  # noqa: E402
+from common.schema import PRICING_FEATURES  # noqa: E402
+
+
+def start_api(data, work_dir, port, workers, timeout):
+    # Fully offline: a file-based MLflow store in work_dir, empty on the
+    # first run, so the API trains and registers a model from the CSV.
+    # The prediction cache is off so every request reaches the model.
+    shutil.copy(data, os.path.join(work_dir, 'get_around_pricing_project.csv'))
+    env = dict(
+        os.environ,
+        APP_URI='file://' + os.path.join(work_dir, 'mlruns'),
+        ARTIFACT_CACHE_DIR=os.path.join(work_dir, 'model_cache'),
+        PYTHONPATH=os.pathsep.join([API_DIR, ROOT_DIR]),
+        CACHE_MAX_MB='0',
+        MODEL_POLL_INTERVAL='0',
+        WEB_CONCURRENCY=str(workers),
+        PORT=str(port),
+    )
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', os.path.join(API_DIR, 'gunicorn.conf.py'), 'api:app'],
+        cwd=work_dir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError('API exited during startup')
+        try:
+            if requests.get(f'http://localhost:{port}/ready', timeout=1).status_code == 200:
+                return server
+        except requests.ConnectionError:
+            pass
+        time.sleep(0.5)
+    server.kill()
+    raise RuntimeError('API did not become ready')
+
+
+def payloads(data, batch_size, n=64):
+    # A few distinct bodies per batch size, encoded once up front so the
+    # generator only measures the API.
+    rng = np.random.default_rng(0)
+    bodies = []
+    for _ in range(n):
+        rows = data.iloc[rng.integers(0, len(data), batch_size)]
+        bodies.append(json.dumps(rows.to_dict('list')).encode())
+    return bodies
+
+
+def run_load(url, bodies, concurrency, duration, warm_up):
+    # Closed loop: each of `concurrency` threads sends its next request as
+    # soon as the previous one returns, over its own keep-alive connection.
+    latencies = [[] for _ in range(concurrency)]
+    errors = [0] * concurrency
+    stop_at = [0.0]
+    measure_from = [0.0]
+
+    def worker(i):
+        session = requests.Session()
+        j = i
+        while True:
+            start = time.perf_counter()
+            if start >= stop_at[0]:
+                break
+            try:
+                response = session.post(url, data=bodies[j % len(bodies)], timeout=30,
+                                        headers={'Content-Type': 'application/json'})
+                ok = response.status_code == 200
+            except requests.RequestException:
+                ok = False
+            end = time.perf_counter()
+            j += concurrency
+            if start < measure_from[0]:
+                continue
+            if ok:
+                latencies[i].append(end - start)
+            else:
+                errors[i] += 1
+        session.close()
+
+    now = time.perf_counter()
+    measure_from[0] = now + warm_up
+    stop_at[0] = now + warm_up + duration
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return np.concatenate([np.asarray(l) for l in latencies]), sum(errors)
+
+
+def summarize(latencies, errors, tier, batch_size, concurrency, duration):
+    result = {'tier': tier, 'batch_size': batch_size, 'concurrency': concurrency,
+              'requests': len(latencies), 'errors': errors}
+    if len(latencies):
+        p50, p95, p99 = np.percentile(latencies * 1000, [50, 95, 99])
+        result.update({
+            'requests_per_second': round(len(latencies) / duration, 1),
+            'rows_per_second': round(len(latencies) * batch_size / duration, 1),
+            'mean_ms': round(float(latencies.mean() * 1000), 3),
+            'p50_ms': round(float(p50), 3),
+            'p95_ms': round(float(p95), 3),
+            'p99_ms': round(float(p99), 3),
+        })
+    return result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Throughput and latency percentiles of /predict, offline')
+    parser.add_argument('--data', default=os.path.join(API_DIR, 'get_around_pricing_project.csv'))
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 16, 256])
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32])
+    parser.add_argument('--tiers', nargs='+', default=['accurate'], choices=['accurate', 'fast'])
+    parser.add_argument('--duration', type=float, default=10, help='seconds measured per combination')
+    parser.add_argument('--warm-up', type=float, default=1, help='seconds discarded before measuring')
+    parser.add_argument('--workers', type=int, default=1, help='gunicorn workers')
+    parser.add_argument('--port', type=int, default=8012)
+    parser.add_argument('--work-dir', default=None, help='keeps the MLflow store between runs')
+    parser.add_argument('--timeout', type=float, default=600)
+    parser.add_argument('--output', default=None)
+    args = parser.parse_args()
+
+    data = pd.read_csv(args.data, index_col=0)[PRICING_FEATURES]
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix='bench-load-')
+    os.makedirs(work_dir, exist_ok=True)
+    server = start_api(args.data, work_dir, args.port, args.workers, args.timeout)
+    results = []
+    try:
+        for tier in args.tiers:
+            url = f'http://localhost:{args.port}/predict?tier={tier}'
+            for batch_size in args.batch_sizes:
+                bodies = payloads(data, batch_size)
+                for concurrency in args.concurrency:
+                    latencies, errors = run_load(url, bodies, concurrency, args.duration, args.warm_up)
+                    result = summarize(latencies, errors, tier, batch_size, concurrency, args.duration)
+                    print(json.dumps(result), flush=True)
+                    results.append(result)
+    finally:
+        server.terminate()
+        server.wait()
+        if args.work_dir is None:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    report.write(args.output, 'load', results)
@@ -0,0 +1,95 @@
+import os
+import sys
+import json
+import time
+import argparse
+import numpy as np
+import pandas as pd
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.join(BENCH_DIR, '..')
+FRONT_DIR = os.path.join(ROOT_DIR, 'front')
+sys.path[:0] = [FRONT_DIR, ROOT_DIR, BENCH_DIR]
+import report  # noqa: E402
+from utils import preprocess  # noqa: E402
+
+
+# Row-wise implementation preprocessed_df used to run, kept as the
+# reference for the parity check and the "before" timings.
+def _change_state(state, delay):
+    if state == 'ended':
+        if delay > 0:
+            return 'delayed'
+        elif delay <= 0:
+            return 'on time'
+        else:
+            return 'NR'
+    elif state == 'canceled':
+        return 'canceled'
+
+def _get_past_delay(row, df):
+    delay = np.nan
+    if not np.isnan(row['previous_ended_rental_id']):
+        delay = df[df['rental_id'] == row['previous_ended_rental_id']]['delay_at_checkout_in_minutes'].values[0]
+    return delay
+
+def _get_impact(delay, state):
+    impact = '-'
+    if not np.isnan(delay):
+        if delay > 0:
+            if state == 'canceled':
+                impact = 'cancelation'
+            else:
+                impact = 'late checkin'
+        else:
+            impact = 'no impact'
+    return impact
+
+def preprocess_rowwise(df):
+    df['past_delay'] = df.apply(_get_past_delay, args=[df], axis=1)
+    df['checkin_delay_in_minutes'] = df['past_delay'] - df['time_delta_with_previous_rental_in_minutes']
+    df['state'] = df.apply(lambda row: _change_state(row['state'], row['delay_at_checkout_in_minutes']), axis=1)
+    df['impact'] = df.apply(lambda row: _get_impact(row['checkin_delay_in_minutes'], row['state']), axis=1)
+    return df
+
+
+def scale_up(df, factor):
+    # Copies of the fleet with shifted ids, so predecessor links stay
+    # inside each copy.
+    offset = int(df['rental_id'].max()) + 1
+    copies = []
+    for i in range(factor):
+        copy = df.copy()
+        copy['rental_id'] += i * offset
+        copy['previous_ended_rental_id'] += i * offset
+        copies.append(copy)
+    return pd.concat(copies, ignore_index=True)
+
+
+def timed(fn, df):
+    start = time.perf_counter()
+    out = fn(df.copy())
+    return out, time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Row-wise vs vectorized delay preprocessing')
+    parser.add_argument('--data', default=os.path.join(FRONT_DIR, 'get_around_delay_analysis.xlsx'))
+    parser.add_argument('--factors', type=int, nargs='+', default=[1, 10, 100])
+    parser.add_argument('--rowwise-max-rows', type=int, default=50_000)
+    parser.add_argument('--output', default=None)
+    args = parser.parse_args()
+
+    raw = pd.read_excel(args.data)
+    results = []
+    for factor in args.factors:
+        df = scale_up(raw, factor)
+        vectorized, vectorized_s = timed(preprocess, df)
+        result = {'rows': len(df), 'vectorized_s': round(vectorized_s, 4)}
+        if len(df) <= args.rowwise_max_rows:
+            rowwise, rowwise_s = timed(preprocess_rowwise, df)
+            pd.testing.assert_frame_equal(vectorized, rowwise)
+            result.update(rowwise_s=round(rowwise_s, 4), identical=True, speedup=round(rowwise_s / vectorized_s, 1))
+        print(json.dumps(result))
+        results.append(result)
+    report.write(args.output, 'preprocessing', results)
@@ -0,0 +1,93 @@
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import subprocess
+
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT_DIR,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def metadata():
+    return {
+        'commit': git_commit(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def write(path, suite, results):
+    # One file per suite run: {"suite", "metadata", "results": [...]}. Each
+    # result carries its parameters and its measurements side by side.
+    report = {'suite': suite, 'metadata': metadata(), 'results': results}
+    if path:
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=2)
+    return report
+
+
+def compare(before, after, metric, keys, threshold):
+    # Matches results on their parameters and flags the ones where metric
+    # grew by more than threshold (a fraction).
+    def index(report):
+        # Reports written before the tiers existed only measured 'accurate'
+        return {
+            tuple(r.get(k, 'accurate' if k == 'tier' else None) for k in keys): r
+            for r in report['results'] if metric in r
+        }
+
+    old, new = index(before), index(after)
+    rows = []
+    for key in (k for k in old if k in new):
+        a, b = old[key][metric], new[key][metric]
+        change = (b - a) / a if a else 0.0
+        rows.append((key, a, b, change, change > threshold))
+    return rows
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare two benchmark reports written by the same suite')
+    parser.add_argument('before')
+    parser.add_argument('after')
+    parser.add_argument('--metric', default=None,
+                        help='default: p95_ms for load, median_ms for hotpaths, search_seconds for train, '
+                             'vectorized_s for preprocessing')
+    parser.add_argument('--threshold', type=float, default=0.1, help='relative increase counted as a regression')
+    args = parser.parse_args()
+
+    with open(args.before) as f:
+        before = json.load(f)
+    with open(args.after) as f:
+        after = json.load(f)
+    if before['suite'] != after['suite']:
+        sys.exit(f"Reports come from different suites: {before['suite']} vs {after['suite']}")
+    if before['suite'] == 'load':
+        metric, keys = args.metric or 'p95_ms', ('tier', 'batch_size', 'concurrency')
+    elif before['suite'] == 'train':
+        metric, keys = args.metric or 'search_seconds', ('jobs',)
+    elif before['suite'] == 'preprocessing':
+        metric, keys = args.metric or 'vectorized_s', ('rows',)
+    else:
+        metric, keys = args.metric or 'median_ms', ('benchmark', 'scale')
+
+    print(f"{before['metadata']['commit']} -> {after['metadata']['commit']}, {metric}")
+    regressions = 0
+    for key, a, b, change, regressed in compare(before, after, metric, keys, args.threshold):
+        regressions += regressed
+        flag = '  REGRESSION' if regressed else ''
+        print(f"{' '.join(map(str, key)):<40} {a:>10.3f} {b:>10.3f} {change:+8.1%}{flag}")
+    sys.exit(1 if regressions else 0)
@@ -0,0 +1,122 @@
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+API_DIR = os.path.join(ROOT_DIR, 'api')
+
+
+def children(pid):
+    with open(f'/proc/{pid}/task/{pid}/children') as f:
+        return [int(p) for p in f.read().split()]
+
+
+def memory(pid):
+    # RSS counts shared pages in full for every worker, PSS splits them
+    # between the processes sharing them.
+    values = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if parts[0] in ('Rss:', 'Pss:', 'Shared_Clean:', 'Shared_Dirty:'):
+                values[parts[0][:-1].lower()] = int(parts[1]) / 1024
+    return values
+
+
+def environment(artifact, **variables):
+    # With an artifact the API runs in its serving mode (see api/serving.py)
+    env = dict(os.environ, PYTHONPATH=ROOT_DIR, MODEL_POLL_INTERVAL='0', **variables)
+    env.pop('SERVING_ARTIFACT', None)
+    if artifact:
+        env['SERVING_ARTIFACT'] = os.path.abspath(artifact)
+    return env
+
+
+def import_time(artifact):
+    # A fresh interpreter importing the app and loading the model, as a
+    # worker does on startup without preloading
+    code = (
+        'import time, resource; start = time.perf_counter(); import api; imported = time.perf_counter(); '
+        'from holder import holder; holder.load(); loaded = time.perf_counter(); '
+        'print(imported - start, loaded - imported, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024)'
+    )
+    output = subprocess.run(
+        [sys.executable, '-c', code], cwd=API_DIR, env=environment(artifact),
+        capture_output=True, text=True, check=True
+    ).stdout.split()
+    return {
+        'serving_artifact': bool(artifact),
+        'import_s': round(float(output[0]), 2),
+        'load_s': round(float(output[1]), 2),
+        'peak_rss_mb': round(float(output[2]), 1),
+    }
+
+
+def run(workers, preload, port, timeout, artifact=None):
+    env = environment(
+        artifact,
+        WEB_CONCURRENCY=str(workers),
+        PRELOAD_MODEL='1' if preload else '0',
+        PORT=str(port),
+    )
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', 'api:app'],
+        cwd=API_DIR, env=env, stderr=subprocess.PIPE, text=True
+    )
+    started = 0
+    try:
+        for line in server.stderr:
+            if 'Application startup complete' in line:
+                started += 1
+                if started == workers:
+                    break
+            if time.perf_counter() - start > timeout:
+                raise TimeoutError(f'{started}/{workers} workers started after {timeout}s')
+        startup = time.perf_counter() - start
+        pids = children(server.pid)
+        worker_memory = [memory(pid) for pid in pids]
+        return {
+            'serving_artifact': bool(artifact),
+            'workers': workers,
+            'preload': preload,
+            'startup_s': round(startup, 2),
+            'master': memory(server.pid),
+            'per_worker': {
+                key: round(sum(m[key] for m in worker_memory) / len(worker_memory), 1)
+                for key in worker_memory[0]
+            },
+            'total_pss_mb': round(sum(m['pss'] for m in worker_memory) + memory(server.pid)['pss'], 1),
+        }
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Per-worker memory and startup time of the API under gunicorn')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--timeout', type=float, default=600)
+    parser.add_argument('--artifact', default=None,
+                        help='directory exported by api/serving.py, to compare the serving mode with the default one')
+    parser.add_argument('--output', default=None)
+    args = parser.parse_args()
+
+    results = []
+    for artifact in (None, args.artifact) if args.artifact else (None,):
+        result = import_time(artifact)
+        print(json.dumps(result))
+        results.append(result)
+        for preload in (False, True):
+            for workers in args.workers:
+                result = run(workers, preload, args.port, args.timeout, artifact)
+                print(json.dumps(result))
+                results.append(result)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
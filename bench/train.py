@@ -0,0 +1,54 @@
+import os
+import sys
+import json
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.join(BENCH_DIR, '..')
+API_DIR = os.path.join(ROOT_DIR, 'api')
+sys.path.insert(0, BENCH_DIR)
+import report  # noqa: E402
+
+
+def run_search(data, work_dir, jobs, trials, folds):
+    # Same trials for every job count (fixed seed), nothing registered. The
+    # design matrix cache is shared, so only the first run builds it.
+    env = dict(
+        os.environ,
+        APP_URI='file://' + os.path.join(work_dir, 'mlruns'),
+        TRAIN_CACHE_DIR=os.path.join(work_dir, 'train_cache'),
+        PYTHONPATH=os.pathsep.join([API_DIR, ROOT_DIR]),
+    )
+    output = subprocess.run(
+        [sys.executable, os.path.join(API_DIR, 'train.py'), '--data', os.path.abspath(data),
+         '--trials', str(trials), '--folds', str(folds), '--jobs', str(jobs), '--no-register'],
+        cwd=work_dir, env=env, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output[output.index('{'):])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Wall-clock time of the hyperparameter search against --jobs')
+    parser.add_argument('--data', default=os.path.join(API_DIR, 'get_around_pricing_project.csv'))
+    parser.add_argument('--jobs', type=int, nargs='+', default=sorted({1, 2, 4, os.cpu_count()}))
+    parser.add_argument('--trials', type=int, default=16)
+    parser.add_argument('--folds', type=int, default=3)
+    parser.add_argument('--output', default=None)
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix='bench-train-')
+    results = []
+    try:
+        for jobs in args.jobs:
+            summary = run_search(args.data, work_dir, jobs, args.trials, args.folds)
+            result = {key: summary[key] for key in ('jobs', 'cpus', 'trials', 'folds', 'search_seconds',
+                                                    'trial_seconds', 'trials_in_flight', 'best_rmse')}
+            result['speedup'] = round(results[0]['search_seconds'] / result['search_seconds'], 2) if results else 1.0
+            print(json.dumps(result), flush=True)
+            results.append(result)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    report.write(args.output, 'train', results)
@@ -0,0 +1,104 @@
+import os
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+CHUNK_SIZE = 1000
+CONCURRENCY = 4
+RETRIES = 3
+BACKOFF = 0.5
+TIMEOUT = (3.05, 30)
+# 429 and 503 are the API's admission control and deadline answers, both
+# come with a Retry-After header that the retries honour.
+RETRY_STATUSES = (429, 502, 503, 504)
+
+
+class PredictionClient:
+    # Client for the /predict endpoint. Connections are kept alive in a pool
+    # sized to the concurrency, failed calls are retried with exponential
+    # backoff, and large fleets are split into chunks sent concurrently,
+    # their predictions put back in the original order. tier selects the
+    # model, 'fast' or 'accurate' (the API's default when None).
+
+    def __init__(self, api_url=None, chunk_size=CHUNK_SIZE, concurrency=CONCURRENCY,
+                 retries=RETRIES, backoff=BACKOFF, timeout=TIMEOUT, tier=None):
+        api_url = api_url or os.environ['API_URL']
+        self.api_url = api_url if api_url.endswith('/') else api_url + '/'
+        self.params = {'tier': tier} if tier else None
+        self.chunk_size = chunk_size
+        self.concurrency = concurrency
+        self.timeout = timeout
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff,
+            status_forcelist=RETRY_STATUSES,
+            # Predictions have no side effect, POST is safe to replay
+            allowed_methods=None,
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=concurrency, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='prediction-client')
+
+    def predict_chunk(self, cars):
+        response = self.session.post(self.api_url + 'predict', json=cars, params=self.params, timeout=self.timeout)
+        response.raise_for_status()
+        body = response.json()
+        return body['prediction'], body['model_version']
+
+    def predict(self, cars):
+        # cars: a dict of feature lists, as /predict expects, or a DataFrame.
+        # Returns the predictions in input order and the model versions
+        # that answered, more than one if a new version was swapped in
+        # while the chunks were in flight.
+        if hasattr(cars, 'to_dict'):
+            cars = cars.to_dict('list')
+        n_rows = len(next(iter(cars.values()))) if cars else 0
+        chunks = [
+            {col: values[start:start + self.chunk_size] for col, values in cars.items()}
+            for start in range(0, n_rows, self.chunk_size)
+        ]
+        if len(chunks) == 1:
+            results = [self.predict_chunk(chunks[0])]
+        else:
+            results = list(self.pool.map(self.predict_chunk, chunks))
+        predictions = [p for chunk_predictions, _ in results for p in chunk_predictions]
+        model_versions = sorted({str(version) for _, version in results})
+        return predictions, model_versions
+
+    def close(self):
+        self.pool.shutdown()
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+if __name__ == '__main__':
+    import pandas as pd
+    from common.schema import PRICING_FEATURES
+
+    parser = argparse.ArgumentParser(description='Score a CSV of cars with the prediction API')
+    parser.add_argument('input', help='CSV with the columns of get_around_pricing_project.csv')
+    parser.add_argument('output', help='CSV to write, the input index and a prediction column')
+    parser.add_argument('--api-url', default=os.environ.get('API_URL', 'http://localhost:8000/'))
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    parser.add_argument('--concurrency', type=int, default=CONCURRENCY)
+    parser.add_argument('--tier', default=None, choices=['fast', 'accurate'])
+    args = parser.parse_args()
+
+    cars = pd.read_csv(args.input, index_col=0)
+    with PredictionClient(args.api_url, chunk_size=args.chunk_size, concurrency=args.concurrency,
+                          tier=args.tier) as client:
+        predictions, model_versions = client.predict(cars[PRICING_FEATURES])
+    pd.DataFrame({'prediction': predictions}, index=cars.index).to_csv(args.output)
+    print(f'{len(predictions)} cars scored by model version {", ".join(model_versions)}')
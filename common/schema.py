@@ -0,0 +1,69 @@
+# Pricing dataset (get_around_pricing_project.csv), shared by the API and the front
+PRICING_CATEGORICAL = ['model_key', 'fuel', 'paint_color', 'car_type']
+PRICING_NUMERIC = ['mileage', 'engine_power']
+PRICING_BOOL = [
+    'private_parking_available',
+    'has_gps',
+    'has_air_conditioning',
+    'automatic_car',
+    'has_getaround_connect',
+    'has_speed_regulator',
+    'winter_tires',
+]
+PRICING_FEATURES = ['model_key', 'mileage', 'engine_power', 'fuel', 'paint_color', 'car_type'] + PRICING_BOOL
+PRICING_TARGET = 'rental_price_per_day'
+PRICING_DTYPES = {
+    **{col: 'category' for col in PRICING_CATEGORICAL},
+    **{col: 'int32' for col in PRICING_NUMERIC},
+    **{col: 'bool' for col in PRICING_BOOL},
+    PRICING_TARGET: 'int32',
+}
+
+
+def _delay_dtypes():
+    # Delay analysis dataset (get_around_delay_analysis.xlsx), after
+    # preprocessing. Labels are fixed categories so frames appended later
+    # keep the dtype.
+    import pandas as pd
+
+    checkin_types = pd.CategoricalDtype(['mobile', 'connect'])
+    states = pd.CategoricalDtype(['delayed', 'on time', 'NR', 'canceled'])
+    impacts = pd.CategoricalDtype(['-', 'no impact', 'late checkin', 'cancelation'])
+    return {
+        'CHECKIN_TYPES': checkin_types,
+        'STATES': states,
+        'IMPACTS': impacts,
+        'DELAY_DTYPES': {
+            'rental_id': 'int32',
+            'car_id': 'int32',
+            'checkin_type': checkin_types,
+            'state': states,
+            # Nullable columns stay floating point: minutes and rental ids
+            # are whole numbers below 2**24, which float32 represents exactly.
+            'delay_at_checkout_in_minutes': 'float32',
+            'previous_ended_rental_id': 'float32',
+            'time_delta_with_previous_rental_in_minutes': 'float32',
+            'past_delay': 'float32',
+            'checkin_delay_in_minutes': 'float32',
+            'impact': impacts,
+        },
+    }
+
+
+def __getattr__(name):
+    # pandas is imported on first use of the delay dtypes, so the API's
+    # serving mode, which only needs the pricing column lists, runs without it
+    if name in ('CHECKIN_TYPES', 'STATES', 'IMPACTS', 'DELAY_DTYPES'):
+        globals().update(_delay_dtypes())
+        return globals()[name]
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+def apply_schema(df, dtypes):
+    return df.astype({col: dtype for col, dtype in dtypes.items() if col in df.columns})
+
+
+def read_pricing_csv(path='get_around_pricing_project.csv'):
+    import pandas as pd
+
+    return apply_schema(pd.read_csv(path, index_col=0), PRICING_DTYPES)
@@ -2,8 +2,12 @@ import os
 import streamlit as st
 import pandas as pd
 import requests
-import plotly.express as px
-from utils import get_outlier, add_car, preprocessed_df, run_simulation, create_pie
+from utils import add_car, create_pie_from_counts
+from data_cache import load_preprocessed, data_version
+from simulation import SimulationEngine, create_tradeoff_chart
+from summary import AnalysisSummary
+from metadata import ModelMetadata
+from common.client import PredictionClient
 
 
 st.set_page_config(
@@ -14,14 +18,38 @@ st.set_page_config(
 st.sidebar.title("Navigation")
 page = st.sidebar.radio("Go to", ("Analysis", "Simulation", "Price prediction"))
 
-@st.cache_data
-def load_data():
-    df = preprocessed_df()
-    df_timedelay = df[df['state'] == 'delayed']  
-    df_consecutive = df[df['impact'] != '-']
-    return df, df_timedelay, df_consecutive
+# Everything below is cached per data version: reruns triggered by widgets
+# only read precomputed values and figures.
+@st.cache_resource
+def load_data(version):
+    return load_preprocessed()
 
-df, df_timedelay, df_consecutive = load_data()
+@st.cache_resource
+def load_summary(version):
+    data = load_data(version)
+    return AnalysisSummary(data.aggregates, data.df_timedelay)
+
+@st.cache_resource
+def load_simulation_engine(version):
+    return SimulationEngine(load_data(version).df_consecutive)
+
+@st.cache_resource
+def load_tradeoff_chart(version, max_threshold, threshold, scope):
+    curve = load_simulation_engine(version).sweep_all(max_threshold)
+    return create_tradeoff_chart(curve, threshold, scope)
+
+# One API client per process, shared by every session: its connection
+# pool is reused across reruns.
+@st.cache_resource
+def load_prediction_client(api_url):
+    return PredictionClient(api_url)
+
+@st.cache_resource
+def load_model_metadata(api_url):
+    return ModelMetadata(api_url, load_prediction_client(api_url).session)
+
+version = data_version()
+summary = load_summary(version)
 
 if page == 'Analysis':
     st.title('Getaround Analysis 🚗')
@@ -36,9 +64,9 @@ even had to cancel their rental because the car wasn’t returned on time.
 """)
 
     st.header('Main indicators')
-    total_rentals = df.shape[0]
-    unique_cars = df['car_id'].nunique()
-    delayed_rentals = df_timedelay.shape[0]
+    total_rentals = summary.total_rentals
+    unique_cars = summary.unique_cars
+    delayed_rentals = summary.delayed_rentals
     col1, col2, col3 = st.columns(3)
 
     with col1:
@@ -57,28 +85,11 @@ even had to cancel their rental because the car wasn’t returned on time.
     col1, col2 = st.columns(2)
 
     with col1:
-        fig = create_pie(df, 'state', 'State Distribution')
-        fig.update_layout(height=400, width=440, margin=dict(l=35, r=10, t=45, b=0))
-        st.plotly_chart(fig) 
-
-        bin_size = 15
-        num_bins = int((df_timedelay['delay_at_checkout_in_minutes'].max() + bin_size) / bin_size)
-        fig = px.histogram(df_timedelay, x='delay_at_checkout_in_minutes', nbins=num_bins,
-                            title='Distribution of Delay at Checkout in Minutes',
-                            histnorm='percent')
-        fig.update_xaxes(range=[0, 400])
-        st.plotly_chart(fig)
+        st.plotly_chart(summary.figures['state'])
+        st.plotly_chart(summary.figures['delay_histogram'])
     
     with col2:
-        lower_bound, upper_bound = get_outlier(df_timedelay, 'delay_at_checkout_in_minutes')
-
-        df_filtered = df_timedelay[(df_timedelay['delay_at_checkout_in_minutes'] >= lower_bound) & 
-                               (df_timedelay['delay_at_checkout_in_minutes'] <= upper_bound)]
-
-        fig = px.box(df_filtered, y='delay_at_checkout_in_minutes', title='Delay at Checkout in Minutes')
-        fig.update_yaxes(title='Minutes of delay')
-        fig.update_layout(height=400, width=440, margin=dict(l=35, r=10, t=45, b=0))
-        st.plotly_chart(fig) 
+        st.plotly_chart(summary.figures['delay_box'])
         st.write('')
         st.write('')
         st.write('')
@@ -92,35 +103,16 @@ even had to cancel their rental because the car wasn’t returned on time.
                  ''')
     st.subheader('Checkin type')
     col1, col2 = st.columns(2)
-    checkin_type = df['checkin_type'].value_counts()
-    checkin_typ_ontime = df[df['state'] != 'delayed']['checkin_type'].value_counts()
-    checkin_type_delayed = df_timedelay['checkin_type'].value_counts()
+    checkin_type = summary.checkin_type
     
     with col1:
         st.metric('Rentals made by mobile', checkin_type.get('mobile', 0))
     with col2:
         st.metric('Rentals made by connected app', checkin_type.get('connect', 0))
 
-    data = {
-    'checkin_type': list(checkin_type.index) + list(checkin_type_delayed.index) + list(checkin_typ_ontime.index),
-    'count': list(checkin_type.values) + list(checkin_type_delayed.values) + list(checkin_typ_ontime.values),
-    'category': ['All rentals'] * len(checkin_type) + ['Delayed rentals'] * len(checkin_type_delayed) + ['On time rentals'] * len(checkin_typ_ontime)
-        }
-
-    df_combined = pd.DataFrame(data)
-    df_combined['proportion'] = df_combined.groupby('category')['count'].transform(lambda x: x / x.sum())
     col1, col2 = st.columns([0.6, 0.4])
     with col1:  
-        fig = px.bar(
-            df_combined,
-            x='checkin_type',
-            y='proportion',
-            color='category',
-            barmode='group',
-            title='Proportion of Check-in Types (All rentals vs. Delayed rentals)',
-            labels={'proportion': 'Proportion', 'checkin_type': 'Check-in Type'}
-        )
-        st.plotly_chart(fig)
+        st.plotly_chart(summary.figures['checkin_type'])
     with col2:
         st.write('')
         st.write('')
@@ -133,9 +125,9 @@ even had to cancel their rental because the car wasn’t returned on time.
                  ''')
     st.header('Impact of delay on next rental')
  
-    consecutive_rental = df_consecutive.shape[0]
-    was_late = df_consecutive[df_consecutive['impact'] == 'late checkin'].shape[0]
-    got_cancel = df_consecutive[df_consecutive['impact'] == 'cancelation'].shape[0]
+    consecutive_rental = summary.consecutive_rentals
+    was_late = summary.late_checkins
+    got_cancel = summary.cancelations
     
     col1, col2, col3 = st.columns(3)
     with col1:
@@ -148,11 +140,7 @@ even had to cancel their rental because the car wasn’t returned on time.
         st.metric('Cancellation due to Delay', got_cancel)
         st.metric('% of Consecutive Rentals', f'{round((got_cancel / consecutive_rental)*100, 2)}%')
 
-    impact_df = df_consecutive['impact'].value_counts(normalize=True).reset_index()
-    fig = px.bar(impact_df, x='impact', y='proportion', title='Impact proportions')
-    fig.update_layout(yaxis_title='')
-
-    st.plotly_chart(fig)
+    st.plotly_chart(summary.figures['impact'])
 
 elif page == 'Simulation':
     st.title('Simulation')
@@ -171,30 +159,44 @@ directly see the potential impact.
         scope = st.radio('scope', ['All', 'connect', 'mobile'])
         run = st.form_submit_button(label='Run the simulation')
     
+    engine = load_simulation_engine(version)
     if run:
-        df_run, lost_rental, cancel_avoided = run_simulation(df_consecutive, threshold, scope)
+        impact_after, lost_rental, cancel_avoided = engine.query(threshold, scope)
         col1, col2, col3 = st.columns([0.4, 0.2, 0.4])        
         with col1:
             st.metric('Lost Rentals', lost_rental)
             st.subheader('Distribution of state pre simulation')
-            fig = create_pie(df_consecutive, 'impact', '')
-            fig.update_layout(height=400, width=440, margin=dict(l=35, r=10, t=45, b=0))
-            st.plotly_chart(fig)
+            st.plotly_chart(summary.figures['impact_pie'])
             
         with col3:
             st.metric('Cancellations Avoided', cancel_avoided) 
             st.subheader('Distribution of state post simulation')
-            fig = create_pie(df_run, 'impact', '')
+            fig = create_pie_from_counts(impact_after, 'impact', '')
             fig.update_layout(height=400, width=440, margin=dict(l=35, r=10, t=45, b=0))
             st.plotly_chart(fig)
+
+    st.subheader('Trade-off for every threshold')
+    max_threshold = st.slider('Maximum threshold (minutes)', min_value=0, max_value=1000, value=720, step=15)
+    fig = load_tradeoff_chart(
+        version,
+        max_threshold,
+        threshold if run else None,
+        scope if run else None
+    )
+    st.plotly_chart(fig, use_container_width=True)
     
     
 elif page == 'Price prediction':
-    data = pd.read_csv('get_around_pricing_project.csv')
-    unique_model_keys = data['model_key'].unique().tolist()
-    unique_fuels = data['fuel'].unique().tolist()
-    unique_paint_colors = data['paint_color'].unique().tolist()
-    unique_car_types = data['car_type'].unique().tolist()
+    model_metadata = load_model_metadata(os.environ['API_URL'])
+    try:
+        metadata = model_metadata.get()
+    except requests.RequestException as e:
+        st.error(f'Unable to reach the API: {e}')
+        st.stop()
+    unique_model_keys = metadata['categorical']['model_key']
+    unique_fuels = metadata['categorical']['fuel']
+    unique_paint_colors = metadata['categorical']['paint_color']
+    unique_car_types = metadata['categorical']['car_type']
 
     if 'car_list' not in st.session_state:
         st.session_state['car_list'] = []
@@ -206,7 +208,7 @@ elif page == 'Price prediction':
              ''')
     st.subheader("Add Car Details")
     with st.form(key='car_form'):
-        car_data = add_car(unique_model_keys, unique_fuels, unique_paint_colors, unique_car_types)
+        car_data = add_car(unique_model_keys, unique_fuels, unique_paint_colors, unique_car_types, metadata['numeric'])
         submitted = st.form_submit_button(label='Add Car')
 
     if submitted:
@@ -232,14 +234,13 @@ elif page == 'Price prediction':
         if make_prediction:
             cars_dict = {key: [car[key] for car in st.session_state.car_list] for key in st.session_state.car_list[0]}
         
-            api_url = os.environ['API_URL']
-            api_url += "predict"
-            response = requests.post(api_url, json=cars_dict)
-            if response.status_code == 200:
-                prediction = response.json()
-                predictions = prediction['prediction']
+            try:
+                predictions, model_versions = load_prediction_client(os.environ['API_URL']).predict(cars_dict)
+            except requests.RequestException:
+                st.write("Error: Unable to get prediction")
+            else:
+                for model_version in model_versions:
+                    model_metadata.check_version(model_version)
 
                 for i, pred in zip(cars_df.index,predictions):
                     st.write(f'**Price per day prediction for car {i+1}**: {round(pred,2)}€') 
-            else:
-                st.write("Error: Unable to get prediction")
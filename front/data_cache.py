@@ -0,0 +1,178 @@
+import os
+import shutil
+import hashlib
+import inspect
+import logging
+import json
+import tempfile
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+import utils
+import incremental
+from incremental import DelayAggregates, IncrementalDelayAnalysis
+from common import schema
+from common.schema import DELAY_DTYPES, apply_schema
+
+
+DATA_CACHE_DIR = os.environ.get('DATA_CACHE_DIR', '.data_cache')
+FRAME = 'df.feather'
+# Hash of each source row, in the order of the frame, and the Analysis page
+# counts: what a data change needs to be ingested incrementally.
+ROW_HASHES = 'rows.npy'
+AGGREGATES = 'aggregates.json'
+# Any change to these functions, or to the shared schema, invalidates the
+# cached frame.
+PREPROCESSING_CODE = (
+    utils.get_checkout_delay_index,
+    utils.get_past_delay,
+    utils.change_state,
+    utils.get_impact_of_previous_rental_delay,
+    utils.preprocess,
+    incremental,
+    schema,
+)
+
+
+def code_version():
+    digest = hashlib.sha256()
+    for code in PREPROCESSING_CODE:
+        digest.update(inspect.getsource(code).encode())
+    return digest.hexdigest()[:16]
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()[:16]
+
+
+class DelayData:
+    # The preprocessed frame plus the row positions of its delayed and
+    # consecutive rentals. The filtered views are only materialized on
+    # access, so a session holds a single copy of the data.
+
+    def __init__(self, df, aggregates):
+        self.df = df
+        self.aggregates = aggregates
+        self.delayed = np.flatnonzero(df['state'] == 'delayed')
+        self.consecutive = np.flatnonzero(df['impact'] != '-')
+
+    @property
+    def df_timedelay(self):
+        return self.df.iloc[self.delayed]
+
+    @property
+    def df_consecutive(self):
+        return self.df.iloc[self.consecutive]
+
+
+def data_version(source='get_around_delay_analysis.xlsx'):
+    return f'{file_hash(source)}-{code_version()}'
+
+
+def to_table(df):
+    # Floats keep NaN as a value rather than becoming Arrow nulls: without a
+    # validity mask to turn back into NaN, every column read from the
+    # uncompressed, memory-mapped file is a view of the file, not a copy.
+    table = pa.Table.from_pandas(df)
+    for i, col in enumerate(table.column_names):
+        if col in df and df[col].dtype.kind == 'f':
+            table = table.set_column(i, col, pa.array(df[col].to_numpy(), from_pandas=False))
+    return table
+
+
+def read_frame(path):
+    # Read-only columns backed by the page cache, shared by every process
+    # reading the same file
+    table = feather.read_table(path, memory_map=True)
+    return table.to_pandas(split_blocks=True, self_destruct=True)
+
+
+def row_hashes(raw):
+    return pd.util.hash_pandas_object(raw, index=False).to_numpy()
+
+
+def read_cache(path):
+    with open(os.path.join(path, AGGREGATES)) as f:
+        aggregates = DelayAggregates.from_dict(json.load(f))
+    return read_frame(os.path.join(path, FRAME)), aggregates, np.load(os.path.join(path, ROW_HASHES))
+
+
+def previous_cache(cache_dir, key):
+    # The entry of an earlier version of the data, same preprocessing code
+    suffix = key.split('-', 1)[1]
+    if not os.path.isdir(cache_dir):
+        return None
+    for name in os.listdir(cache_dir):
+        if name != key and name.endswith(f'-{suffix}'):
+            try:
+                return read_cache(os.path.join(cache_dir, name))
+            except Exception as e:
+                logging.error(f'Ignoring unreadable data cache {name}: {e}')
+    return None
+
+
+def new_rentals(raw, hashes, previous):
+    # The rows of raw that aren't in the previous version, or None when a
+    # previous rental was changed or removed, which needs a full rebuild.
+    df, _, previous_hashes = previous
+    current = pd.Series(hashes, index=raw['rental_id'].to_numpy())
+    if not current.index.is_unique:
+        return None
+    known = current.reindex(df['rental_id'].to_numpy())
+    if known.isna().any() or (known.to_numpy() != previous_hashes).any():
+        return None
+    return raw[~raw['rental_id'].isin(df['rental_id'])]
+
+
+def build_frame(raw, hashes, previous):
+    if previous is not None:
+        new = new_rentals(raw, hashes, previous)
+        if new is not None:
+            df, aggregates, previous_hashes = previous
+            logging.warning(f'... Ingesting {len(new)} new rentals into the cached delay frame ...')
+            analysis = IncrementalDelayAnalysis(df, aggregates)
+            analysis.append(new)
+            new_hashes = hashes[~raw['rental_id'].isin(df['rental_id']).to_numpy()]
+            return analysis.df.reset_index(drop=True), analysis.aggregates, np.concatenate([previous_hashes, new_hashes])
+    df = apply_schema(utils.preprocess(raw), DELAY_DTYPES)
+    return df, DelayAggregates(df), hashes
+
+
+def load_preprocessed(source='get_around_delay_analysis.xlsx', cache_dir=DATA_CACHE_DIR):
+    # A new version of the source only preprocesses its new rentals, on top
+    # of the cached frame and counts of the previous version.
+    key = data_version(source)
+    path = os.path.join(cache_dir, key)
+    if os.path.isdir(path):
+        try:
+            df, aggregates, _ = read_cache(path)
+            return DelayData(df, aggregates)
+        except Exception as e:
+            logging.error(f'Discarding unreadable data cache {path}: {e}')
+            shutil.rmtree(path, ignore_errors=True)
+
+    raw = pd.read_excel(source)
+    hashes = row_hashes(raw)
+    df, aggregates, hashes = build_frame(raw, hashes, previous_cache(cache_dir, key))
+    staging = None
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        staging = tempfile.mkdtemp(dir=cache_dir, prefix='.staging-')
+        feather.write_feather(to_table(df), os.path.join(staging, FRAME), compression='uncompressed')
+        np.save(os.path.join(staging, ROW_HASHES), hashes)
+        with open(os.path.join(staging, AGGREGATES), 'w') as f:
+            json.dump(aggregates.to_dict(), f)
+        for old in os.listdir(cache_dir):
+            if old != key and not old.startswith('.'):
+                shutil.rmtree(os.path.join(cache_dir, old), ignore_errors=True)
+        os.rename(staging, path)
+    except OSError as e:
+        logging.error(f'Could not write data cache {path}: {e}')
+        if staging is not None:
+            shutil.rmtree(staging, ignore_errors=True)
+    return DelayData(df, aggregates)
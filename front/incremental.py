@@ -0,0 +1,140 @@
+from collections import Counter
+import pandas as pd
+from common.schema import DELAY_DTYPES, apply_schema
+from utils import get_checkout_delay_index, get_past_delay, get_impact_of_previous_rental_delay, preprocess
+
+
+class DelayAggregates:
+    # Running counts behind the Analysis page indicators. They are updated
+    # with the rows that were added or changed, never recomputed from scratch.
+
+    def __init__(self, df=None):
+        self.total_rentals = 0
+        self.cars = Counter()
+        self.state = Counter()
+        self.checkin_type = Counter()
+        self.checkin_type_delayed = Counter()
+        self.checkin_type_on_time = Counter()
+        self.impact = Counter()
+        if df is not None:
+            self.add(df)
+
+    def add(self, df, sign=1):
+        delayed = df['state'] == 'delayed'
+        self.total_rentals += sign * len(df)
+        _update(self.cars, df['car_id'], sign)
+        _update(self.state, df['state'], sign)
+        _update(self.checkin_type, df['checkin_type'], sign)
+        _update(self.checkin_type_delayed, df.loc[delayed, 'checkin_type'], sign)
+        _update(self.checkin_type_on_time, df.loc[~delayed, 'checkin_type'], sign)
+        _update(self.impact, df['impact'], sign)
+
+    def remove(self, df):
+        self.add(df, sign=-1)
+
+    def to_dict(self):
+        # JSON-serializable, for the data cache
+        return {
+            'total_rentals': int(self.total_rentals),
+            **{name: {str(k): int(v) for k, v in getattr(self, name).items()} for name in COUNTERS},
+        }
+
+    @classmethod
+    def from_dict(cls, values):
+        aggregates = cls()
+        aggregates.total_rentals = values['total_rentals']
+        for name in COUNTERS:
+            # JSON keys are strings, car ids are ints
+            key = int if name == 'cars' else str
+            getattr(aggregates, name).update({key(k): v for k, v in values[name].items()})
+        return aggregates
+
+    @property
+    def unique_cars(self):
+        return len(self.cars)
+
+    @property
+    def delayed_rentals(self):
+        return self.state['delayed']
+
+    @property
+    def consecutive_rentals(self):
+        return self.total_rentals - self.impact['-']
+
+    @property
+    def late_checkins(self):
+        return self.impact['late checkin']
+
+    @property
+    def cancelations(self):
+        return self.impact['cancelation']
+
+    def impact_proportions(self):
+        consecutive = self.consecutive_rentals
+        return {
+            impact: count / consecutive
+            for impact, count in self.impact.items()
+            if impact != '-' and consecutive
+        }
+
+
+COUNTERS = ('cars', 'state', 'checkin_type', 'checkin_type_delayed', 'checkin_type_on_time', 'impact')
+
+
+def _update(counter, values, sign):
+    for value, count in values.value_counts().items():
+        counter[value] += sign * count
+        if counter[value] == 0:
+            del counter[value]
+
+
+class IncrementalDelayAnalysis:
+    # Keeps the preprocessed delay frame, an index from rental_id to its
+    # checkout delay and the rentals whose predecessor hasn't arrived yet.
+    # append() only preprocesses the new rentals, plus the waiting ones
+    # whose predecessor is part of the batch.
+
+    def __init__(self, df, aggregates=None):
+        # aggregates: those of df when already known, e.g. from the data cache
+        self.df = df
+        self.checkout_delay = get_checkout_delay_index(df)
+        self.aggregates = aggregates if aggregates is not None else DelayAggregates(df)
+        self.waiting = self._waiting(df)
+
+    def _waiting(self, df):
+        previous = df['previous_ended_rental_id']
+        missing = previous.notna() & ~previous.isin(self.checkout_delay.index)
+        return previous[missing]
+
+    def append(self, new_rentals):
+        start = self.df.index.max() + 1 if len(self.df) else 0
+        new = new_rentals.reset_index(drop=True)
+        new.index = new.index + start
+
+        new_delays = get_checkout_delay_index(new)
+        new_delays = new_delays[~new_delays.index.isin(self.checkout_delay.index)]
+        self.checkout_delay = pd.concat([self.checkout_delay, new_delays])
+
+        new = apply_schema(preprocess(new, self.checkout_delay), DELAY_DTYPES)
+        self.aggregates.add(new)
+
+        # Rentals appended earlier whose predecessor just arrived. They are
+        # updated in the concatenated frame: the previous one may be a
+        # read-only view of the data cache.
+        resolved = self.waiting[self.waiting.isin(new_delays.index)].index
+        df = pd.concat([self.df, new])
+        if len(resolved):
+            before = self.df.loc[resolved]
+            after = before.copy()
+            after['past_delay'] = get_past_delay(after, self.checkout_delay)
+            after['checkin_delay_in_minutes'] = after['past_delay'] - after['time_delta_with_previous_rental_in_minutes']
+            after['impact'] = get_impact_of_previous_rental_delay(after['checkin_delay_in_minutes'], after['state'])
+            self.aggregates.remove(before)
+            self.aggregates.add(after)
+            df.loc[resolved, ['past_delay', 'checkin_delay_in_minutes', 'impact']] = after[
+                ['past_delay', 'checkin_delay_in_minutes', 'impact']
+            ]
+
+        self.waiting = pd.concat([self.waiting.drop(resolved), self._waiting(new)])
+        self.df = df
+        return new
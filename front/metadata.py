@@ -0,0 +1,40 @@
+import re
+import time
+import threading
+import requests
+
+
+class ModelMetadata:
+    # Vocabulary and numeric ranges of the serving model, fetched from the
+    # API's /metadata endpoint. The response is reused until its max-age
+    # expires, then revalidated with its ETag, so the body is only
+    # downloaded again when the model version changed. A prediction answered
+    # by another version expires it right away.
+
+    def __init__(self, api_url, session=None, timeout=5):
+        self.url = api_url + 'metadata'
+        self.session = session or requests.Session()
+        self.timeout = timeout
+        self.body = None
+        self.etag = None
+        self.expires = 0
+        self.lock = threading.Lock()
+
+    def get(self):
+        with self.lock:
+            if self.body is not None and time.monotonic() < self.expires:
+                return self.body
+            headers = {'If-None-Match': self.etag} if self.etag else {}
+            response = self.session.get(self.url, headers=headers, timeout=self.timeout)
+            if response.status_code != 304:
+                response.raise_for_status()
+                self.body = response.json()
+                self.etag = response.headers.get('ETag')
+            match = re.search(r'max-age=(\d+)', response.headers.get('Cache-Control', ''))
+            self.expires = time.monotonic() + (int(match.group(1)) if match else 0)
+            return self.body
+
+    def check_version(self, model_version):
+        with self.lock:
+            if self.body is not None and str(model_version) != str(self.body['model_version']):
+                self.expires = 0
@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+import plotly.express as px
+
+
+SCOPES = ('All', 'connect', 'mobile')
+IMPACTS = ('no impact', 'late checkin', 'cancelation')
+
+
+class SimulationEngine:
+    # For each scope, the consecutive rentals sorted by time delta with the
+    # previous rental, with cumulative counts per impact. A threshold then
+    # removes a prefix of that order, found with a binary search, instead of
+    # filtering and copying the frame.
+
+    def __init__(self, df_consecutive):
+        self.impact_counts = df_consecutive['impact'].value_counts()
+        self.scopes = {}
+        for scope in SCOPES:
+            df = df_consecutive
+            if scope != 'All':
+                df = df[df['checkin_type'] == scope]
+            order = np.argsort(df['time_delta_with_previous_rental_in_minutes'].to_numpy(), kind='stable')
+            deltas = df['time_delta_with_previous_rental_in_minutes'].to_numpy()[order]
+            impacts = df['impact'].to_numpy()[order]
+            cumulative = {
+                impact: np.concatenate([[0], np.cumsum(impacts == impact)])
+                for impact in IMPACTS
+            }
+            self.scopes[scope] = (deltas, cumulative)
+
+    def removed(self, threshold, scope):
+        deltas, cumulative = self.scopes[scope]
+        n = np.searchsorted(deltas, threshold, side='right')
+        return {impact: int(counts[n]) for impact, counts in cumulative.items()}
+
+    def query(self, threshold, scope):
+        removed = self.removed(threshold, scope)
+        cancel_avoided = removed['cancelation']
+        lost_rental = sum(removed.values()) - cancel_avoided
+        remaining = self.impact_counts.sub(pd.Series(removed), fill_value=0)
+        remaining = remaining[remaining > 0].astype(int).sort_values(ascending=False)
+        return remaining, lost_rental, cancel_avoided
+
+    def sweep(self, scope, max_threshold=None):
+        # The counts only change at observed time deltas, so those are the
+        # only thresholds needed to draw the whole curve.
+        deltas, cumulative = self.scopes[scope]
+        thresholds = np.unique(np.concatenate([[0], deltas]))
+        if max_threshold is not None:
+            thresholds = thresholds[thresholds <= max_threshold]
+        n = np.searchsorted(deltas, thresholds, side='right')
+        cancel_avoided = cumulative['cancelation'][n]
+        return pd.DataFrame({
+            'threshold': thresholds,
+            'scope': scope,
+            'lost_rentals': n - cancel_avoided,
+            'cancellations_avoided': cancel_avoided,
+            'late_checkins_avoided': cumulative['late checkin'][n],
+        })
+
+    def sweep_all(self, max_threshold=None):
+        return pd.concat([self.sweep(scope, max_threshold) for scope in SCOPES], ignore_index=True)
+
+
+def create_tradeoff_chart(curve, threshold=None, scope=None):
+    fig = px.line(
+        curve,
+        x='lost_rentals',
+        y='cancellations_avoided',
+        color='scope',
+        line_shape='hv',
+        hover_data=['threshold', 'late_checkins_avoided'],
+        title='Cancellations avoided vs. rentals lost, for every threshold',
+        labels={'lost_rentals': 'Lost rentals', 'cancellations_avoided': 'Cancellations avoided'}
+    )
+    if threshold is not None:
+        points = curve[curve['threshold'] <= threshold].groupby('scope').tail(1)
+        if scope is not None:
+            points = points[points['scope'] == scope]
+        fig.add_scatter(
+            x=points['lost_rentals'],
+            y=points['cancellations_avoided'],
+            mode='markers',
+            marker=dict(size=12, color='black'),
+            name=f'threshold = {threshold}'
+        )
+    return fig
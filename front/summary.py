@@ -0,0 +1,88 @@
+import pandas as pd
+import plotly.express as px
+from utils import get_outlier, create_pie_from_counts
+
+
+DELAY_COLUMN = 'delay_at_checkout_in_minutes'
+PIE_LAYOUT = dict(height=400, width=440, margin=dict(l=35, r=10, t=45, b=0))
+
+
+class AnalysisSummary:
+    # Every metric and figure of the Analysis page, computed once per data
+    # version. Page reruns only read these values. The indicators come from
+    # the running counts of the data cache, only the delay figures need the
+    # delayed rows.
+
+    def __init__(self, aggregates, df_timedelay):
+        self.total_rentals = aggregates.total_rentals
+        self.unique_cars = aggregates.unique_cars
+        self.delayed_rentals = aggregates.delayed_rentals
+        self.checkin_type = pd.Series(aggregates.checkin_type).sort_values(ascending=False)
+        self.checkin_type_delayed = pd.Series(aggregates.checkin_type_delayed).sort_values(ascending=False)
+        self.checkin_type_on_time = pd.Series(aggregates.checkin_type_on_time).sort_values(ascending=False)
+        self.consecutive_rentals = aggregates.consecutive_rentals
+        self.late_checkins = aggregates.late_checkins
+        self.cancelations = aggregates.cancelations
+        self.impact_counts = pd.Series({k: v for k, v in aggregates.impact.items() if k != '-'}).sort_values(ascending=False)
+        self.outlier_bounds = get_outlier(df_timedelay, DELAY_COLUMN)
+        self.figures = {
+            'state': self._state_pie(aggregates),
+            'delay_histogram': self._delay_histogram(df_timedelay),
+            'delay_box': self._delay_box(df_timedelay),
+            'checkin_type': self._checkin_type_bar(),
+            'impact': self._impact_bar(),
+            'impact_pie': self._impact_pie(),
+        }
+
+    def _state_pie(self, aggregates):
+        counts = pd.Series(aggregates.state).sort_values(ascending=False).rename_axis('state')
+        fig = create_pie_from_counts(counts, 'state', 'State Distribution')
+        fig.update_layout(**PIE_LAYOUT)
+        return fig
+
+    def _delay_histogram(self, df_timedelay):
+        bin_size = 15
+        num_bins = int((df_timedelay[DELAY_COLUMN].max() + bin_size) / bin_size)
+        fig = px.histogram(df_timedelay, x=DELAY_COLUMN, nbins=num_bins,
+                           title='Distribution of Delay at Checkout in Minutes',
+                           histnorm='percent')
+        fig.update_xaxes(range=[0, 400])
+        return fig
+
+    def _delay_box(self, df_timedelay):
+        lower_bound, upper_bound = self.outlier_bounds
+        delay = df_timedelay[DELAY_COLUMN]
+        df_filtered = df_timedelay[(delay >= lower_bound) & (delay <= upper_bound)]
+        fig = px.box(df_filtered, y=DELAY_COLUMN, title='Delay at Checkout in Minutes')
+        fig.update_yaxes(title='Minutes of delay')
+        fig.update_layout(**PIE_LAYOUT)
+        return fig
+
+    def _checkin_type_bar(self):
+        data = {
+            'checkin_type': list(self.checkin_type.index) + list(self.checkin_type_delayed.index) + list(self.checkin_type_on_time.index),
+            'count': list(self.checkin_type.values) + list(self.checkin_type_delayed.values) + list(self.checkin_type_on_time.values),
+            'category': ['All rentals'] * len(self.checkin_type) + ['Delayed rentals'] * len(self.checkin_type_delayed) + ['On time rentals'] * len(self.checkin_type_on_time)
+        }
+        df_combined = pd.DataFrame(data)
+        df_combined['proportion'] = df_combined.groupby('category')['count'].transform(lambda x: x / x.sum())
+        return px.bar(
+            df_combined,
+            x='checkin_type',
+            y='proportion',
+            color='category',
+            barmode='group',
+            title='Proportion of Check-in Types (All rentals vs. Delayed rentals)',
+            labels={'proportion': 'Proportion', 'checkin_type': 'Check-in Type'}
+        )
+
+    def _impact_bar(self):
+        impact_df = (self.impact_counts / self.impact_counts.sum()).rename_axis('impact').rename('proportion').reset_index()
+        fig = px.bar(impact_df, x='impact', y='proportion', title='Impact proportions')
+        fig.update_layout(yaxis_title='')
+        return fig
+
+    def _impact_pie(self):
+        fig = create_pie_from_counts(self.impact_counts.rename_axis('impact'), 'impact', '')
+        fig.update_layout(**PIE_LAYOUT)
+        return fig
@@ -4,44 +4,50 @@ import pandas as pd
 import plotly.express as px
 
 
+def get_checkout_delay_index(df):
+    return df.drop_duplicates('rental_id').set_index('rental_id')['delay_at_checkout_in_minutes']
+
+def get_past_delay(df, checkout_delay=None):
+    # Indexed lookup of each rental's predecessor instead of scanning the
+    # whole frame per row. Unknown predecessors give NaN.
+    if checkout_delay is None:
+        checkout_delay = get_checkout_delay_index(df)
+    return df['previous_ended_rental_id'].map(checkout_delay)
+
 def change_state(state, delay):
-    if state == 'ended':
-        if delay > 0:
-            return 'delayed'
-        elif delay <= 0:
-            return 'on time'
-        else:
-            return 'NR'
-    elif state == 'canceled':
-        return 'canceled'
-
-def get_past_delay(row, df):
-    delay = np.nan
-    if not np.isnan(row['previous_ended_rental_id']):
-        delay = df[df['rental_id'] == row['previous_ended_rental_id']]['delay_at_checkout_in_minutes'].values[0]
-    return delay
+    return np.select(
+        [
+            (state == 'ended') & (delay > 0),
+            (state == 'ended') & (delay <= 0),
+            state == 'ended',
+            state == 'canceled',
+        ],
+        ['delayed', 'on time', 'NR', 'canceled'],
+        default=None
+    )
 
 def get_impact_of_previous_rental_delay(delay, state):
-    impact = '-'
-    if not np.isnan(delay):
-        if delay > 0:
-            if state == 'canceled':
-                impact = 'cancelation'
-            else:
-                impact = 'late checkin'
-        else:
-            impact = 'no impact'
-    return impact
+    return np.select(
+        [
+            delay.isna(),
+            (delay > 0) & (state == 'canceled'),
+            delay > 0,
+        ],
+        ['-', 'cancelation', 'late checkin'],
+        default='no impact'
+    )
 
-def preprocessed_df():
-    df = pd.read_excel('get_around_delay_analysis.xlsx')
-    df['past_delay'] = df.apply(get_past_delay, args=[df], axis=1)
+def preprocess(df, checkout_delay=None):
+    df['past_delay'] = get_past_delay(df, checkout_delay)
     df['checkin_delay_in_minutes'] = df['past_delay'] - df['time_delta_with_previous_rental_in_minutes']
-    df['state'] = df.apply(lambda row: change_state(row['state'], row['delay_at_checkout_in_minutes']), axis=1)
-    df['impact'] = df.apply(lambda row: get_impact_of_previous_rental_delay(row['checkin_delay_in_minutes'], row['state']), axis=1)
-    
+    df['state'] = change_state(df['state'], df['delay_at_checkout_in_minutes'])
+    df['impact'] = get_impact_of_previous_rental_delay(df['checkin_delay_in_minutes'], df['state'])
     return df
 
+def preprocessed_df():
+    df = pd.read_excel('get_around_delay_analysis.xlsx')
+    return preprocess(df)
+
 def get_outlier(df, col):
     Q1 = df[col].quantile(0.25)
     Q3 = df[col].quantile(0.75)
@@ -67,17 +73,26 @@ def run_simulation(df, threshold, scope):
         )
 
 def create_pie(df, col, title):
-    counts = df[col].value_counts()
+    return create_pie_from_counts(df[col].value_counts(), col, title)
+
+def create_pie_from_counts(counts, col, title):
     counts_df = counts.reset_index()
     counts_df.columns = [col, 'count']
     fig = px.pie(counts_df, names=col, values='count', title=title)
     return fig
 
-def add_car(unique_model_keys, unique_fuels, unique_paint_colors, unique_car_types):
+def slider_range(numeric_ranges, col, min_value, max_value, value):
+    # Bounds the model was fitted on when the API reports them
+    ranges = (numeric_ranges or {}).get(col, {})
+    min_value = ranges.get('min', min_value)
+    max_value = ranges.get('max', max_value)
+    return dict(min_value=min_value, max_value=max_value, value=min(max(value, min_value), max_value))
+
+def add_car(unique_model_keys, unique_fuels, unique_paint_colors, unique_car_types, numeric_ranges=None):
     # Get user input for one car
     model_key = st.selectbox('Model Key', unique_model_keys, key=f'model_key_{len(st.session_state.car_list)}')
-    mileage = st.slider('Mileage', min_value=0, max_value=1_000_000, value=150_000, step=5, key=f'mileage_{len(st.session_state.car_list)}')
-    engine_power = st.slider('Engine Power', min_value=0, max_value=500, value=120, step=5, key=f'engine_power_{len(st.session_state.car_list)}')
+    mileage = st.slider('Mileage', **slider_range(numeric_ranges, 'mileage', 0, 1_000_000, 150_000), step=5, key=f'mileage_{len(st.session_state.car_list)}')
+    engine_power = st.slider('Engine Power', **slider_range(numeric_ranges, 'engine_power', 0, 500, 120), step=5, key=f'engine_power_{len(st.session_state.car_list)}')
     fuel = st.selectbox('Fuel Type', unique_fuels, key=f'fuel_{len(st.session_state.car_list)}')
     paint_color = st.selectbox('Paint Color', unique_paint_colors, key=f'paint_color_{len(st.session_state.car_list)}')
     car_type = st.selectbox('Car Type', unique_car_types, key=f'car_type_{len(st.session_state.car_list)}')
@@ -23,7 +23,8 @@ deploy_front() {
 
   heroku create $HEROKU_FRONT_APP_NAME
   heroku container:login
-  heroku container:push web -a $HEROKU_FRONT_APP_NAME
+  # Built from the repository root so the image includes common/
+  heroku container:push web -a $HEROKU_FRONT_APP_NAME --context-path ..
   heroku container:release web -a $HEROKU_FRONT_APP_NAME
 
   echo "Front-end deployment completed."
@@ -38,7 +39,7 @@ deploy_api() {
 
   heroku create $HEROKU_API_APP_NAME
   heroku container:login
-  heroku container:push web -a $HEROKU_API_APP_NAME
+  heroku container:push web -a $HEROKU_API_APP_NAME --context-path ..
   heroku container:release web -a $HEROKU_API_APP_NAME
 
   heroku_info=$(heroku apps:info -a $HEROKU_API_APP_NAME --json)
@@ -0,0 +1,30 @@
+import os
+import sys
+import tempfile
+import pytest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# The API modules import each other by their flat names, as in the container
+sys.path[:0] = [os.path.join(ROOT_DIR, 'api'), ROOT_DIR]
+# model.py points mlflow at APP_URI on import: keep the tests off any real store
+os.environ.setdefault('APP_URI', 'file://' + tempfile.mkdtemp(prefix='mlruns-'))
+
+PRICING_CSV = os.environ.get('PRICING_CSV', os.path.join(ROOT_DIR, 'api', 'get_around_pricing_project.csv'))
+
+
+@pytest.fixture(scope='session')
+def pricing_data():
+    if not os.path.exists(PRICING_CSV):
+        pytest.skip(f'{PRICING_CSV} not found, set PRICING_CSV')
+    from common.schema import PRICING_TARGET, read_pricing_csv
+
+    data = read_pricing_csv(PRICING_CSV)
+    return data.drop(PRICING_TARGET, axis=1), data[PRICING_TARGET]
+
+
+@pytest.fixture(scope='session')
+def pipeline(pricing_data):
+    from model import build_pipeline
+
+    X, y = pricing_data
+    return build_pipeline(n_estimators=20).fit(X, y)
@@ -0,0 +1,60 @@
+import asyncio
+import numpy as np
+import pytest
+from pydantic import ValidationError
+from api import CarModel
+from batcher import MicroBatcher
+
+CAR = {
+    'model_key': ['Renault'],
+    'mileage': [109839],
+    'engine_power': [135],
+    'fuel': ['diesel'],
+    'paint_color': ['black'],
+    'car_type': ['sedan'],
+    'private_parking_available': [True],
+    'has_gps': [True],
+    'has_air_conditioning': [False],
+    'automatic_car': [False],
+    'has_getaround_connect': [True],
+    'has_speed_regulator': [False],
+    'winter_tires': [True],
+}
+
+
+def test_car_model_accepts_equal_lengths():
+    CarModel.model_validate({col: values * 3 for col, values in CAR.items()})
+
+
+def test_car_model_rejects_ragged_payload():
+    with pytest.raises(ValidationError, match='one value per car'):
+        CarModel.model_validate({**CAR, 'model_key': ['Renault', 'Citroën']})
+
+
+def predict_mileage(x):
+    # Stands in for the model: fails on any batch holding a negative mileage
+    if min(x['mileage']) < 0:
+        raise ValueError('negative mileage')
+    return np.asarray(x['mileage'], dtype=np.float32), '1'
+
+
+def test_batcher_isolates_failing_request():
+    async def run():
+        batcher = MicroBatcher(predict_mileage, max_wait_ms=50)
+        batcher.start()
+        try:
+            return await asyncio.gather(
+                batcher.submit({'mileage': [-1]}),
+                batcher.submit({'mileage': [10, 20]}),
+                return_exceptions=True
+            ), batcher.stats()
+        finally:
+            await batcher.stop()
+
+    (bad, good), stats = asyncio.run(run())
+    # Both requests were coalesced into one batch, which failed as a whole
+    assert stats['batch_requests']['count'] == 1
+    assert isinstance(bad, ValueError)
+    prediction, model_version = good
+    assert prediction.tolist() == [10, 20]
+    assert model_version == '1'
@@ -0,0 +1,31 @@
+import numpy as np
+from fast import CompiledModel, check_parity
+import serving
+
+
+def test_compiled_matches_pipeline(pipeline, pricing_data):
+    X, _ = pricing_data
+    ok, max_diff = check_parity(pipeline, CompiledModel.from_pipeline(pipeline), X)
+    assert ok, f'max abs diff {max_diff}'
+
+
+def test_native_booster_matches_pipeline(pipeline, pricing_data, tmp_path):
+    # The C API path the serving artifact uses, against the sklearn wrapper
+    X, _ = pricing_data
+    compiled = CompiledModel.from_pipeline(pipeline)
+    path = str(tmp_path / serving.BOOSTER_FILE)
+    compiled.booster.save_model(path)
+    native = CompiledModel(compiled.spec, serving.load_booster(path))
+    assert isinstance(native.booster, serving.NativeBooster)
+    ok, max_diff = check_parity(pipeline, native, X)
+    assert ok, f'max abs diff {max_diff}'
+
+
+def test_unknown_category_matches_pipeline(pipeline, pricing_data):
+    # handle_unknown='ignore': an unseen category encodes as all zeros
+    X, _ = pricing_data
+    X = X.head(50).copy()
+    X['model_key'] = 'Unknown brand'
+    compiled = CompiledModel.from_pipeline(pipeline)
+    got = compiled({col: X[col].to_numpy() for col in X.columns})
+    np.testing.assert_allclose(got, pipeline.predict(X), rtol=1e-5, atol=1e-3)
@@ -0,0 +1,46 @@
+import json
+import numpy as np
+import pytest
+from fastapi.exceptions import RequestValidationError
+import payload
+from payload import decode_json, decode_json_chunked, json_response, json_response_chunked
+from test_batcher import CAR
+
+CARS = {col: values * 20 for col, values in CAR.items()}
+
+
+@pytest.fixture(autouse=True)
+def small_chunks(monkeypatch):
+    # Several chunks for a 20-car payload
+    monkeypatch.setattr(payload, 'CHUNK_ROWS', 7)
+
+
+def decode_errors(decode, body):
+    with pytest.raises(RequestValidationError) as e:
+        decode(body)
+    return [(error['type'], error['loc'], error['msg']) for error in e.value.errors()]
+
+
+def test_chunked_decode_matches_single_call():
+    body = json.dumps(CARS, indent=2).encode()
+    assert decode_json_chunked(body) == decode_json(body)
+
+
+@pytest.mark.parametrize('cars', [
+    {**CARS, 'mileage': CARS['mileage'][:15] + ['far'] + CARS['mileage'][16:]},
+    {**CARS, 'fuel': CARS['fuel'][:3]},
+    {col: values for col, values in CARS.items() if col != 'fuel'},
+])
+def test_chunked_decode_reports_the_same_errors(cars):
+    body = json.dumps(cars).encode()
+    assert decode_errors(decode_json_chunked, body) == decode_errors(decode_json, body)
+
+
+def test_chunked_decode_rejects_malformed_json():
+    body = json.dumps(CARS).encode()[:-3]
+    assert decode_errors(decode_json_chunked, body) == decode_errors(decode_json, body)
+
+
+def test_chunked_encode_matches_single_call():
+    prediction = np.random.default_rng(0).random(20, dtype=np.float32) * 100
+    assert json_response_chunked(prediction, '3', {}).body == json_response(prediction, '3', {}).body